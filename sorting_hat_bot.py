@@ -1,1104 +1,3325 @@
-import os
-import random
-import sqlite3
-from datetime import datetime
-
-import discord
-from discord.ext import commands
-
-TOKEN = os.getenv("DISCORD_TOKEN")  # set this in your environment
-
-COMMAND_PREFIX = "!"
-DB_FILE = "sorting_hat.sqlite3"
-
-HOUSES = ["Gryffindor", "Hufflepuff", "Ravenclaw", "Slytherin"]
-
-HOUSE_ROLE_COLORS = {
-    "Gryffindor": discord.Color.red(),
-    "Hufflepuff": discord.Color.gold(),
-    "Ravenclaw": discord.Color.blue(),
-    "Slytherin": discord.Color.green(),
-}
-
-intents = discord.Intents.default()
-intents.guilds = True
-intents.members = True
-intents.message_content = True
-intents.reactions = True
-
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
-
-# ----------------------------
-# QUIZ CONFIG
-# ----------------------------
-QUIZ_TIMEOUT = 60  # seconds per question
-ACTIVE_QUIZZES: set[int] = set()
-
-QUIZ_QUESTIONS = [
-    {
-        "q": "You see someone being bullied. What do you do?",
-        "options": {
-            "A": ("Step in immediately, even if it’s risky.", {"Gryffindor": 3, "Hufflepuff": 1}),
-            "B": ("Get help / rally people to stop it safely.", {"Hufflepuff": 3, "Ravenclaw": 1}),
-            "C": ("Assess the situation and plan the most effective move.", {"Ravenclaw": 3, "Slytherin": 1}),
-            "D": ("Use influence/pressure to make it stop—fast.", {"Slytherin": 3, "Gryffindor": 1}),
-        },
-    },
-    {
-        "q": "What do you value most?",
-        "options": {
-            "A": ("Bravery", {"Gryffindor": 3}),
-            "B": ("Loyalty", {"Hufflepuff": 3}),
-            "C": ("Knowledge", {"Ravenclaw": 3}),
-            "D": ("Ambition", {"Slytherin": 3}),
-        },
-    },
-    {
-        "q": "Pick a class you’d never skip:",
-        "options": {
-            "A": ("Defense Against the Dark Arts", {"Gryffindor": 2, "Slytherin": 1}),
-            "B": ("Herbology", {"Hufflepuff": 3}),
-            "C": ("Charms", {"Ravenclaw": 3}),
-            "D": ("Potions", {"Slytherin": 3}),
-        },
-    },
-    {
-        "q": "Your ideal weekend is:",
-        "options": {
-            "A": ("Adventure / exploring somewhere new", {"Gryffindor": 2, "Ravenclaw": 1}),
-            "B": ("Cozy time with friends/family", {"Hufflepuff": 3}),
-            "C": ("Learning something or a creative project", {"Ravenclaw": 3}),
-            "D": ("Working on goals / leveling up", {"Slytherin": 3}),
-        },
-    },
-]
-
-# ----------------------------
-# REACTION POINTS CONFIG
-# ----------------------------
-REACTION_POINTS = {
-    "❤️": 1,
-    "❤": 1,
-    "😂": 1,
-    "🤣": 1,
-    "😍": 1,
-    "👍": 1,
-    "💯": 1,  # <-- added
-    "😢": -1,
-    "😭": -1,
-    "👎": -1,
-}
-
-ALLOWED_REACTION_CHANNEL_IDS: set[int] = set()
-
-
-def db():
-    return sqlite3.connect(DB_FILE)
-
-
-def init_db():
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                guild_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                house TEXT,
-                points INTEGER NOT NULL DEFAULT 0,
-                sorted_at TEXT,
-                PRIMARY KEY (guild_id, user_id)
-            )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS points_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER NOT NULL,
-                target_user_id INTEGER NOT NULL,
-                moderator_user_id INTEGER NOT NULL,
-                delta INTEGER NOT NULL,
-                reason TEXT,
-                created_at TEXT NOT NULL
-            )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS reaction_awards (
-                guild_id INTEGER NOT NULL,
-                message_id INTEGER NOT NULL,
-                reactor_user_id INTEGER NOT NULL,
-                emoji TEXT NOT NULL,
-                delta INTEGER NOT NULL,
-                created_at TEXT NOT NULL,
-                PRIMARY KEY (guild_id, message_id, reactor_user_id, emoji)
-            )
-        """)
-        con.commit()
-
-
-def get_user_record(guild_id: int, user_id: int):
-    with db() as con:
-        cur = con.cursor()
-        cur.execute(
-            "SELECT house, points, sorted_at FROM users WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id),
-        )
-        return cur.fetchone()
-
-
-def set_user_house(guild_id: int, user_id: int, house: str):
-    now = datetime.utcnow().isoformat()
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            INSERT INTO users (guild_id, user_id, house, points, sorted_at)
-            VALUES (?, ?, ?, 0, ?)
-            ON CONFLICT(guild_id, user_id) DO UPDATE SET house=excluded.house, sorted_at=excluded.sorted_at
-        """, (guild_id, user_id, house, now))
-        con.commit()
-
-
-def add_points(guild_id: int, target_user_id: int, moderator_user_id: int, delta: int, reason: str | None):
-    now = datetime.utcnow().isoformat()
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            INSERT INTO users (guild_id, user_id, house, points, sorted_at)
-            VALUES (?, ?, NULL, 0, NULL)
-            ON CONFLICT(guild_id, user_id) DO NOTHING
-        """, (guild_id, target_user_id))
-        cur.execute("""
-            UPDATE users SET points = points + ? WHERE guild_id=? AND user_id=?
-        """, (delta, guild_id, target_user_id))
-        cur.execute("""
-            INSERT INTO points_log (guild_id, target_user_id, moderator_user_id, delta, reason, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (guild_id, target_user_id, moderator_user_id, delta, reason, now))
-        con.commit()
-
-
-async def get_or_create_role(guild: discord.Guild, house: str) -> discord.Role:
-    role = discord.utils.get(guild.roles, name=house)
-    if role:
-        return role
-    return await guild.create_role(
-        name=house,
-        colour=HOUSE_ROLE_COLORS.get(house, discord.Color.default()),
-        reason="Sorting Hat: create house role",
-    )
-
-
-async def assign_house_role(member: discord.Member, house: str):
-    role = await get_or_create_role(member.guild, house)
-
-    other_roles = [r for r in member.roles if r.name in HOUSES and r.name != house]
-    if other_roles:
-        await member.remove_roles(*other_roles, reason="Sorting Hat: changing house")
-
-    if role not in member.roles:
-        await member.add_roles(role, reason="Sorting Hat: assigned house")
-
-
-# ----------------------------
-# QUIZ ENGINE
-# ----------------------------
-async def run_sorting_quiz_for_user(user: discord.User) -> str:
-    """DM-based quiz for a specific user. Returns house."""
-    if user.id in ACTIVE_QUIZZES:
-        raise RuntimeError("Quiz already running for that user.")
-
-    ACTIVE_QUIZZES.add(user.id)
-    scores = {h: 0 for h in HOUSES}
-
-    try:
-        dm = await user.create_dm()
-        await dm.send(
-            "🪄 **Sorting Hat Test**\n"
-            "Reply with **A / B / C / D** for each question.\n"
-            f"You have **{QUIZ_TIMEOUT}s** per question. Let’s begin!"
-        )
-
-        def check(m: discord.Message):
-            return m.author.id == user.id and isinstance(m.channel, discord.DMChannel)
-
-        for i, item in enumerate(QUIZ_QUESTIONS, start=1):
-            opts_text = "\n".join([f"**{k}** — {v[0]}" for k, v in item["options"].items()])
-            await dm.send(f"**Q{i}.** {item['q']}\n{opts_text}")
-
-            try:
-                msg = await bot.wait_for("message", check=check, timeout=QUIZ_TIMEOUT)
-            except TimeoutError:
-                await dm.send("⌛ Time’s up. Run `!sort` again when you’re ready.")
-                raise
-
-            choice = msg.content.strip().upper()
-            if choice not in item["options"]:
-                await dm.send("❌ Please reply with **A / B / C / D** only. Run `!sort` again.")
-                raise ValueError("Invalid choice")
-
-            weights = item["options"][choice][1]
-            for house, pts in weights.items():
-                scores[house] += pts
-
-        best = max(scores.values())
-        tied = [h for h, s in scores.items() if s == best]
-        house = random.choice(tied)
-
-        await dm.send(f"✨ The Sorting Hat has decided… **{house}**!")
-        return house
-
-    finally:
-        ACTIVE_QUIZZES.discard(user.id)
-
-
-# ----------------------------
-# REACTION AWARDS HELPERS
-# ----------------------------
-def _emoji_key(payload_emoji: discord.PartialEmoji) -> str:
-    return str(payload_emoji)
-
-
-def record_reaction_award(guild_id: int, message_id: int, reactor_id: int, emoji: str, delta: int) -> bool:
-    now = datetime.utcnow().isoformat()
-    with db() as con:
-        cur = con.cursor()
-        try:
-            cur.execute("""
-                INSERT INTO reaction_awards (guild_id, message_id, reactor_user_id, emoji, delta, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (guild_id, message_id, reactor_id, emoji, delta, now))
-            con.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-
-
-def remove_reaction_award(guild_id: int, message_id: int, reactor_id: int, emoji: str):
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            SELECT delta FROM reaction_awards
-            WHERE guild_id=? AND message_id=? AND reactor_user_id=? AND emoji=?
-        """, (guild_id, message_id, reactor_id, emoji))
-        row = cur.fetchone()
-        if not row:
-            return None
-        (delta,) = row
-        cur.execute("""
-            DELETE FROM reaction_awards
-            WHERE guild_id=? AND message_id=? AND reactor_user_id=? AND emoji=?
-        """, (guild_id, message_id, reactor_id, emoji))
-        con.commit()
-        return delta
-
-
-# ----------------------------
-# EVENTS
-# ----------------------------
-@bot.event
-async def on_ready():
-    init_db()
-    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
-
-
-@bot.event
-async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
-    if payload.guild_id is None:
-        return
-    if payload.user_id == bot.user.id:
-        return
-
-    if ALLOWED_REACTION_CHANNEL_IDS and payload.channel_id not in ALLOWED_REACTION_CHANNEL_IDS:
-        return
-
-    emoji = _emoji_key(payload.emoji)
-    if emoji not in REACTION_POINTS:
-        return
-
-    guild = bot.get_guild(payload.guild_id)
-    if guild is None:
-        return
-
-    channel = guild.get_channel(payload.channel_id)
-    if channel is None:
-        try:
-            channel = await bot.fetch_channel(payload.channel_id)
-        except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-            return
-
-    try:
-        message = await channel.fetch_message(payload.message_id)
-    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-        return
-
-    if message.author.bot:
-        return
-    if message.author.id == payload.user_id:
-        return
-
-    delta = REACTION_POINTS[emoji]
-
-    if not record_reaction_award(payload.guild_id, payload.message_id, payload.user_id, emoji, delta):
-        return
-
-    add_points(payload.guild_id, message.author.id, payload.user_id, delta,
-               f"Reaction {emoji} on msg {payload.message_id}")
-
-
-@bot.event
-async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
-    if payload.guild_id is None:
-        return
-    if payload.user_id == bot.user.id:
-        return
-
-    if ALLOWED_REACTION_CHANNEL_IDS and payload.channel_id not in ALLOWED_REACTION_CHANNEL_IDS:
-        return
-
-    emoji = _emoji_key(payload.emoji)
-    if emoji not in REACTION_POINTS:
-        return
-
-    previous_delta = remove_reaction_award(payload.guild_id, payload.message_id, payload.user_id, emoji)
-    if previous_delta is None:
-        return
-
-    guild = bot.get_guild(payload.guild_id)
-    if guild is None:
-        return
-
-    channel = guild.get_channel(payload.channel_id)
-    if channel is None:
-        try:
-            channel = await bot.fetch_channel(payload.channel_id)
-        except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-            return
-
-    try:
-        message = await channel.fetch_message(payload.message_id)
-    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-        return
-
-    if message.author.bot:
-        return
-    if message.author.id == payload.user_id:
-        return
-
-    add_points(payload.guild_id, message.author.id, payload.user_id, -previous_delta,
-               f"Removed reaction {emoji} on msg {payload.message_id}")
-
-
-# ----------------------------
-# COMMANDS
-# ----------------------------
-@bot.command(name="sort")
-async def sort_me(ctx: commands.Context):
-    record = get_user_record(ctx.guild.id, ctx.author.id)
-    if record and record[0] in HOUSES:
-        await ctx.reply(f"🪄 You’re already sorted into **{record[0]}**! Use `!resort` if you allow re-sorting.")
-        return
-
-    try:
-        house = await run_sorting_quiz_for_user(ctx.author)
-    except discord.Forbidden:
-        await ctx.reply("❌ I can’t DM you. Please enable DMs from server members and try `!sort` again.")
-        return
-    except Exception:
-        return
-
-    set_user_house(ctx.guild.id, ctx.author.id, house)
-    await assign_house_role(ctx.author, house)
-    await ctx.reply(f"✨ The Sorting Hat has spoken! **{ctx.author.display_name}** → **{house}**")
-
-
-@bot.command(name="resort")
-@commands.has_permissions(manage_guild=True)
-async def resort(ctx: commands.Context, member: discord.Member | None = None):
-    """(Admin) Re-sort yourself or a mentioned member via DM quiz."""
-    member = member or ctx.author
-
-    try:
-        house = await run_sorting_quiz_for_user(member)
-    except discord.Forbidden:
-        if member.id == ctx.author.id:
-            await ctx.reply("❌ I can’t DM you. Please enable DMs from server members and try `!resort` again.")
-        else:
-            await ctx.reply(f"❌ I can’t DM **{member.display_name}**. They need to enable DMs from server members.")
-        return
-    except Exception:
-        return
-
-    set_user_house(ctx.guild.id, member.id, house)
-    await assign_house_role(member, house)
-    await ctx.reply(f"🔁 Re-sorted **{member.display_name}** into **{house}**")
-
-
-@bot.group(name="points", invoke_without_command=True)
-async def points_group(ctx: commands.Context):
-    await ctx.reply("Use `!points add @user 10 reason` or `!points remove @user 5 reason`")
-
-
-@points_group.command(name="add")
-@commands.has_permissions(manage_messages=True)
-async def points_add(ctx: commands.Context, member: discord.Member, amount: int, *, reason: str = None):
-    if amount <= 0:
-        await ctx.reply("Amount must be positive.")
-        return
-    add_points(ctx.guild.id, member.id, ctx.author.id, amount, reason)
-    await ctx.reply(f"🏆 Added **{amount}** points to **{member.display_name}**. ({reason or 'no reason'})")
-
-
-@points_group.command(name="remove")
-@commands.has_permissions(manage_messages=True)
-async def points_remove(ctx: commands.Context, member: discord.Member, amount: int, *, reason: str = None):
-    if amount <= 0:
-        await ctx.reply("Amount must be positive.")
-        return
-    add_points(ctx.guild.id, member.id, ctx.author.id, -amount, reason)
-    await ctx.reply(f"🧨 Removed **{amount}** points from **{member.display_name}**. ({reason or 'no reason'})")
-
-
-@bot.command(name="house")
-async def my_house(ctx: commands.Context, member: discord.Member | None = None):
-    member = member or ctx.author
-    record = get_user_record(ctx.guild.id, member.id)
-    if not record or not record[0]:
-        await ctx.reply(f"❓ **{member.display_name}** isn’t sorted yet. Use `!sort`.")
-        return
-    house, points, sorted_at = record
-    await ctx.reply(f"🏰 **{member.display_name}** → **{house}** | **{points}** points")
-
-
-@bot.command(name="pointscheck")
-async def points_check(ctx: commands.Context, member: discord.Member | None = None):
-    member = member or ctx.author
-    record = get_user_record(ctx.guild.id, member.id)
-    if not record:
-        await ctx.reply(f"❓ No record for **{member.display_name}** yet.")
-        return
-    house, points, _ = record
-    await ctx.reply(f"🔎 **{member.display_name}** has **{points}** points. ({house or 'Unsorted'})")
-
-
-@bot.command(name="leaderboard")
-async def leaderboard(ctx: commands.Context, limit: int = 10):
-    limit = max(1, min(limit, 25))
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            SELECT user_id, points, house
-            FROM users
-            WHERE guild_id=?
-            ORDER BY points DESC
-            LIMIT ?
-        """, (ctx.guild.id, limit))
-        rows = cur.fetchall()
-
-    if not rows:
-        await ctx.reply("No points yet.")
-        return
-
-    lines = []
-    for i, (user_id, points, house) in enumerate(rows, start=1):
-        user = ctx.guild.get_member(user_id)
-        name = user.display_name if user else f"<@{user_id}>"
-        lines.append(f"**{i}.** {name} — **{points}** ({house or 'Unsorted'})")
-
-    await ctx.reply("📊 **Leaderboard**\n" + "\n".join(lines))
-
-
-@bot.command(name="housecup")
-async def house_cup(ctx: commands.Context):
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            SELECT house, COALESCE(SUM(points), 0) as total
-            FROM users
-            WHERE guild_id=? AND house IS NOT NULL
-            GROUP BY house
-            ORDER BY total DESC
-        """, (ctx.guild.id,))
-        rows = cur.fetchall()
-
-    if not rows:
-        await ctx.reply("No house totals yet. People need to `!sort` first.")
-        return
-
-    lines = [f"**{i}. {house}** — **{total}**" for i, (house, total) in enumerate(rows, start=1)]
-    await ctx.reply("🏆 **House Cup Standings**\n" + "\n".join(lines))
-
-
-@bot.event
-async def on_command_error(ctx, error):
-    if isinstance(error, commands.MissingPermissions):
-        await ctx.reply("❌ You don’t have permission for that command (need **Manage Messages**).")
-        return
-    if isinstance(error, commands.MemberNotFound):
-        await ctx.reply("❌ I can’t find that user. Try mentioning them like `@name`.")
-        return
-    if isinstance(error, commands.MissingRequiredArgument):
-        await ctx.reply("❌ Missing info. Example: `!points remove @user 5 reason`")
-        return
-    if isinstance(error, commands.BadArgument):
-        await ctx.reply("❌ Bad format. Example: `!points remove @user 5 reason`")
-        return
-
-    await ctx.reply(f"❌ Error: `{type(error).__name__}`")
-
-
-if __name__ == "__main__":
-    if not TOKEN:
-        raise SystemExit("Missing DISCORD_TOKEN environment variable.")
-    bot.run(TOKEN)
-import os
-import random
-import sqlite3
-from datetime import datetime
-
-import discord
-from discord.ext import commands
-
-TOKEN = os.getenv("DISCORD_TOKEN")  # set this in your environment
-
-COMMAND_PREFIX = "!"
-DB_FILE = "sorting_hat.sqlite3"
-
-HOUSES = ["Gryffindor", "Hufflepuff", "Ravenclaw", "Slytherin"]
-
-HOUSE_ROLE_COLORS = {
-    "Gryffindor": discord.Color.red(),
-    "Hufflepuff": discord.Color.gold(),
-    "Ravenclaw": discord.Color.blue(),
-    "Slytherin": discord.Color.green(),
-}
-
-intents = discord.Intents.default()
-intents.guilds = True
-intents.members = True
-intents.message_content = True
-intents.reactions = True  # <-- important for reaction points reliability
-
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
-
-# ----------------------------
-# QUIZ CONFIG
-# ----------------------------
-QUIZ_TIMEOUT = 60  # seconds per question
-ACTIVE_QUIZZES: set[int] = set()
-
-QUIZ_QUESTIONS = [
-    {
-        "q": "You see someone being bullied. What do you do?",
-        "options": {
-            "A": ("Step in immediately, even if it’s risky.", {"Gryffindor": 3, "Hufflepuff": 1}),
-            "B": ("Get help / rally people to stop it safely.", {"Hufflepuff": 3, "Ravenclaw": 1}),
-            "C": ("Assess the situation and plan the most effective move.", {"Ravenclaw": 3, "Slytherin": 1}),
-            "D": ("Use influence/pressure to make it stop—fast.", {"Slytherin": 3, "Gryffindor": 1}),
-        },
-    },
-    {
-        "q": "What do you value most?",
-        "options": {
-            "A": ("Bravery", {"Gryffindor": 3}),
-            "B": ("Loyalty", {"Hufflepuff": 3}),
-            "C": ("Knowledge", {"Ravenclaw": 3}),
-            "D": ("Ambition", {"Slytherin": 3}),
-        },
-    },
-    {
-        "q": "Pick a class you’d never skip:",
-        "options": {
-            "A": ("Defense Against the Dark Arts", {"Gryffindor": 2, "Slytherin": 1}),
-            "B": ("Herbology", {"Hufflepuff": 3}),
-            "C": ("Charms", {"Ravenclaw": 3}),
-            "D": ("Potions", {"Slytherin": 3}),
-        },
-    },
-    {
-        "q": "Your ideal weekend is:",
-        "options": {
-            "A": ("Adventure / exploring somewhere new", {"Gryffindor": 2, "Ravenclaw": 1}),
-            "B": ("Cozy time with friends/family", {"Hufflepuff": 3}),
-            "C": ("Learning something or a creative project", {"Ravenclaw": 3}),
-            "D": ("Working on goals / leveling up", {"Slytherin": 3}),
-        },
-    },
-]
-
-# ----------------------------
-# REACTION POINTS CONFIG
-# ----------------------------
-REACTION_POINTS = {
-    "❤️": 1,
-    "❤": 1,   # <-- variant support
-    "😂": 1,
-    "🤣": 1,
-    "😍": 1,
-    "👍": 1,
-    "😢": -1,
-    "😭": -1,
-    "👎": -1,
-}
-
-# If you want reactions to count only in certain channels, put their IDs here.
-# Leave empty to allow anywhere the bot can see.
-ALLOWED_REACTION_CHANNEL_IDS: set[int] = set()
-
-
-def db():
-    return sqlite3.connect(DB_FILE)
-
-
-def init_db():
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                guild_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                house TEXT,
-                points INTEGER NOT NULL DEFAULT 0,
-                sorted_at TEXT,
-                PRIMARY KEY (guild_id, user_id)
-            )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS points_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER NOT NULL,
-                target_user_id INTEGER NOT NULL,
-                moderator_user_id INTEGER NOT NULL,
-                delta INTEGER NOT NULL,
-                reason TEXT,
-                created_at TEXT NOT NULL
-            )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS reaction_awards (
-                guild_id INTEGER NOT NULL,
-                message_id INTEGER NOT NULL,
-                reactor_user_id INTEGER NOT NULL,
-                emoji TEXT NOT NULL,
-                delta INTEGER NOT NULL,
-                created_at TEXT NOT NULL,
-                PRIMARY KEY (guild_id, message_id, reactor_user_id, emoji)
-            )
-        """)
-        con.commit()
-
-
-def get_user_record(guild_id: int, user_id: int):
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("SELECT house, points, sorted_at FROM users WHERE guild_id=? AND user_id=?",
-                    (guild_id, user_id))
-        return cur.fetchone()
-
-
-def set_user_house(guild_id: int, user_id: int, house: str):
-    now = datetime.utcnow().isoformat()
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            INSERT INTO users (guild_id, user_id, house, points, sorted_at)
-            VALUES (?, ?, ?, 0, ?)
-            ON CONFLICT(guild_id, user_id) DO UPDATE SET house=excluded.house, sorted_at=excluded.sorted_at
-        """, (guild_id, user_id, house, now))
-        con.commit()
-
-
-def add_points(guild_id: int, target_user_id: int, moderator_user_id: int, delta: int, reason: str | None):
-    now = datetime.utcnow().isoformat()
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            INSERT INTO users (guild_id, user_id, house, points, sorted_at)
-            VALUES (?, ?, NULL, 0, NULL)
-            ON CONFLICT(guild_id, user_id) DO NOTHING
-        """, (guild_id, target_user_id))
-        cur.execute("""
-            UPDATE users SET points = points + ? WHERE guild_id=? AND user_id=?
-        """, (delta, guild_id, target_user_id))
-        cur.execute("""
-            INSERT INTO points_log (guild_id, target_user_id, moderator_user_id, delta, reason, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (guild_id, target_user_id, moderator_user_id, delta, reason, now))
-        con.commit()
-
-
-async def get_or_create_role(guild: discord.Guild, house: str) -> discord.Role:
-    role = discord.utils.get(guild.roles, name=house)
-    if role:
-        return role
-    return await guild.create_role(
-        name=house,
-        colour=HOUSE_ROLE_COLORS.get(house, discord.Color.default()),
-        reason="Sorting Hat: create house role",
-    )
-
-
-async def assign_house_role(member: discord.Member, house: str):
-    role = await get_or_create_role(member.guild, house)
-
-    other_roles = [r for r in member.roles if r.name in HOUSES and r.name != house]
-    if other_roles:
-        await member.remove_roles(*other_roles, reason="Sorting Hat: changing house")
-
-    if role not in member.roles:
-        await member.add_roles(role, reason="Sorting Hat: assigned house")
-
-
-# ----------------------------
-# QUIZ ENGINE
-# ----------------------------
-async def run_sorting_quiz(ctx: commands.Context) -> str:
-    user = ctx.author
-    if user.id in ACTIVE_QUIZZES:
-        raise RuntimeError("Quiz already running.")
-
-    ACTIVE_QUIZZES.add(user.id)
-    scores = {h: 0 for h in HOUSES}
-
-    try:
-        dm = await user.create_dm()
-        await dm.send(
-            "🪄 **Sorting Hat Test**\n"
-            "Reply with **A / B / C / D** for each question.\n"
-            f"You have **{QUIZ_TIMEOUT}s** per question. Let’s begin!"
-        )
-
-        def check(m: discord.Message):
-            return m.author.id == user.id and isinstance(m.channel, discord.DMChannel)
-
-        for i, item in enumerate(QUIZ_QUESTIONS, start=1):
-            opts_text = "\n".join([f"**{k}** — {v[0]}" for k, v in item["options"].items()])
-            await dm.send(f"**Q{i}.** {item['q']}\n{opts_text}")
-
-            try:
-                msg = await bot.wait_for("message", check=check, timeout=QUIZ_TIMEOUT)
-            except TimeoutError:
-                await dm.send("⌛ Time’s up. Run `!sort` again when you’re ready.")
-                raise
-
-            choice = msg.content.strip().upper()
-            if choice not in item["options"]:
-                await dm.send("❌ Please reply with **A / B / C / D** only. Run `!sort` again.")
-                raise ValueError("Invalid choice")
-
-            weights = item["options"][choice][1]
-            for house, pts in weights.items():
-                scores[house] += pts
-
-        best = max(scores.values())
-        tied = [h for h, s in scores.items() if s == best]
-        house = random.choice(tied)
-
-        await dm.send(f"✨ The Sorting Hat has decided… **{house}**!")
-        return house
-
-    finally:
-        ACTIVE_QUIZZES.discard(user.id)
-
-
-# ----------------------------
-# REACTION AWARDS HELPERS
-# ----------------------------
-def _emoji_key(payload_emoji: discord.PartialEmoji) -> str:
-    return str(payload_emoji)
-
-
-def record_reaction_award(guild_id: int, message_id: int, reactor_id: int, emoji: str, delta: int) -> bool:
-    now = datetime.utcnow().isoformat()
-    with db() as con:
-        cur = con.cursor()
-        try:
-            cur.execute("""
-                INSERT INTO reaction_awards (guild_id, message_id, reactor_user_id, emoji, delta, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (guild_id, message_id, reactor_id, emoji, delta, now))
-            con.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-
-
-def remove_reaction_award(guild_id: int, message_id: int, reactor_id: int, emoji: str):
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            SELECT delta FROM reaction_awards
-            WHERE guild_id=? AND message_id=? AND reactor_user_id=? AND emoji=?
-        """, (guild_id, message_id, reactor_id, emoji))
-        row = cur.fetchone()
-        if not row:
-            return None
-        (delta,) = row
-        cur.execute("""
-            DELETE FROM reaction_awards
-            WHERE guild_id=? AND message_id=? AND reactor_user_id=? AND emoji=?
-        """, (guild_id, message_id, reactor_id, emoji))
-        con.commit()
-        return delta
-
-
-# ----------------------------
-# EVENTS
-# ----------------------------
-@bot.event
-async def on_ready():
-    init_db()
-    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
-
-
-@bot.event
-async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
-    if payload.guild_id is None:
-        return
-    if payload.user_id == bot.user.id:
-        return
-
-    if ALLOWED_REACTION_CHANNEL_IDS and payload.channel_id not in ALLOWED_REACTION_CHANNEL_IDS:
-        return
-
-    emoji = _emoji_key(payload.emoji)
-    if emoji not in REACTION_POINTS:
-        return
-
-    guild = bot.get_guild(payload.guild_id)
-    if guild is None:
-        return
-
-    # Get channel (works for threads too via fetch_channel fallback)
-    channel = guild.get_channel(payload.channel_id)
-    if channel is None:
-        try:
-            channel = await bot.fetch_channel(payload.channel_id)
-        except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-            return
-
-    try:
-        message = await channel.fetch_message(payload.message_id)
-    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-        return
-
-    if message.author.bot:
-        return
-    if message.author.id == payload.user_id:
-        return  # no self-react farming
-
-    delta = REACTION_POINTS[emoji]
-
-    if not record_reaction_award(payload.guild_id, payload.message_id, payload.user_id, emoji, delta):
-        return
-
-    add_points(payload.guild_id, message.author.id, payload.user_id, delta,
-               f"Reaction {emoji} on msg {payload.message_id}")
-
-
-@bot.event
-async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
-    if payload.guild_id is None:
-        return
-    if payload.user_id == bot.user.id:
-        return
-
-    if ALLOWED_REACTION_CHANNEL_IDS and payload.channel_id not in ALLOWED_REACTION_CHANNEL_IDS:
-        return
-
-    emoji = _emoji_key(payload.emoji)
-    if emoji not in REACTION_POINTS:
-        return
-
-    previous_delta = remove_reaction_award(payload.guild_id, payload.message_id, payload.user_id, emoji)
-    if previous_delta is None:
-        return
-
-    guild = bot.get_guild(payload.guild_id)
-    if guild is None:
-        return
-
-    channel = guild.get_channel(payload.channel_id)
-    if channel is None:
-        try:
-            channel = await bot.fetch_channel(payload.channel_id)
-        except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-            return
-
-    try:
-        message = await channel.fetch_message(payload.message_id)
-    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-        return
-
-    if message.author.bot:
-        return
-    if message.author.id == payload.user_id:
-        return
-
-    add_points(payload.guild_id, message.author.id, payload.user_id, -previous_delta,
-               f"Removed reaction {emoji} on msg {payload.message_id}")
-
-
-# ----------------------------
-# COMMANDS
-# ----------------------------
-@bot.command(name="sort")
-async def sort_me(ctx: commands.Context):
-    record = get_user_record(ctx.guild.id, ctx.author.id)
-    if record and record[0] in HOUSES:
-        await ctx.reply(f"🪄 You’re already sorted into **{record[0]}**! Use `!resort` if you allow re-sorting.")
-        return
-
-    try:
-        house = await run_sorting_quiz(ctx)
-    except discord.Forbidden:
-        await ctx.reply("❌ I can’t DM you. Please enable DMs from server members and try `!sort` again.")
-        return
-    except Exception:
-        return
-
-    set_user_house(ctx.guild.id, ctx.author.id, house)
-    await assign_house_role(ctx.author, house)
-    await ctx.reply(f"✨ The Sorting Hat has spoken! **{ctx.author.display_name}** → **{house}**")
-
-
-@bot.command(name="resort")
-@commands.has_permissions(manage_guild=True)
-async def resort(ctx: commands.Context, member: discord.Member | None = None):
-    member = member or ctx.author
-    if member.id != ctx.author.id:
-        await ctx.reply("❌ For now, `!resort` only works on yourself (quiz happens in DM).")
-        return
-
-    try:
-        house = await run_sorting_quiz(ctx)
-    except discord.Forbidden:
-        await ctx.reply("❌ I can’t DM you. Please enable DMs from server members and try `!resort` again.")
-        return
-    except Exception:
-        return
-
-    set_user_house(ctx.guild.id, member.id, house)
-    await assign_house_role(member, house)
-    await ctx.reply(f"🔁 Re-sorted **{member.display_name}** into **{house}**")
-
-
-@bot.group(name="points", invoke_without_command=True)
-async def points_group(ctx: commands.Context):
-    await ctx.reply("Use `!points add @user 10 reason` or `!points remove @user 5 reason`")
-
-
-@points_group.command(name="add")
-@commands.has_permissions(manage_messages=True)
-async def points_add(ctx: commands.Context, member: discord.Member, amount: int, *, reason: str = None):
-    if amount <= 0:
-        await ctx.reply("Amount must be positive.")
-        return
-    add_points(ctx.guild.id, member.id, ctx.author.id, amount, reason)
-    await ctx.reply(f"🏆 Added **{amount}** points to **{member.display_name}**. ({reason or 'no reason'})")
-
-
-@points_group.command(name="remove")
-@commands.has_permissions(manage_messages=True)
-async def points_remove(ctx: commands.Context, member: discord.Member, amount: int, *, reason: str = None):
-    if amount <= 0:
-        await ctx.reply("Amount must be positive.")
-        return
-    add_points(ctx.guild.id, member.id, ctx.author.id, -amount, reason)
-    await ctx.reply(f"🧨 Removed **{amount}** points from **{member.display_name}**. ({reason or 'no reason'})")
-
-
-@bot.command(name="house")
-async def my_house(ctx: commands.Context, member: discord.Member | None = None):
-    member = member or ctx.author
-    record = get_user_record(ctx.guild.id, member.id)
-    if not record or not record[0]:
-        await ctx.reply(f"❓ **{member.display_name}** isn’t sorted yet. Use `!sort`.")
-        return
-    house, points, sorted_at = record
-    await ctx.reply(f"🏰 **{member.display_name}** → **{house}** | **{points}** points")
-
-
-@bot.command(name="pointscheck")
-async def points_check(ctx: commands.Context, member: discord.Member | None = None):
-    """Quick points sanity check (no house needed)."""
-    member = member or ctx.author
-    record = get_user_record(ctx.guild.id, member.id)
-    if not record:
-        await ctx.reply(f"❓ No record for **{member.display_name}** yet.")
-        return
-    house, points, _ = record
-    await ctx.reply(f"🔎 **{member.display_name}** has **{points}** points. ({house or 'Unsorted'})")
-
-
-@bot.command(name="leaderboard")
-async def leaderboard(ctx: commands.Context, limit: int = 10):
-    limit = max(1, min(limit, 25))
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            SELECT user_id, points, house
-            FROM users
-            WHERE guild_id=?
-            ORDER BY points DESC
-            LIMIT ?
-        """, (ctx.guild.id, limit))
-        rows = cur.fetchall()
-
-    if not rows:
-        await ctx.reply("No points yet.")
-        return
-
-    lines = []
-    for i, (user_id, points, house) in enumerate(rows, start=1):
-        user = ctx.guild.get_member(user_id)
-        name = user.display_name if user else f"<@{user_id}>"
-        lines.append(f"**{i}.** {name} — **{points}** ({house or 'Unsorted'})")
-
-    await ctx.reply("📊 **Leaderboard**\n" + "\n".join(lines))
-
-
-@bot.command(name="housecup")
-async def house_cup(ctx: commands.Context):
-    with db() as con:
-        cur = con.cursor()
-        cur.execute("""
-            SELECT house, COALESCE(SUM(points), 0) as total
-            FROM users
-            WHERE guild_id=? AND house IS NOT NULL
-            GROUP BY house
-            ORDER BY total DESC
-        """, (ctx.guild.id,))
-        rows = cur.fetchall()
-
-    if not rows:
-        await ctx.reply("No house totals yet. People need to `!sort` first.")
-        return
-
-    lines = [f"**{i}. {house}** — **{total}**" for i, (house, total) in enumerate(rows, start=1)]
-    await ctx.reply("🏆 **House Cup Standings**\n" + "\n".join(lines))
-
-
-# ----------------------------
-# FRIENDLY COMMAND ERRORS (so you see why remove fails)
-# ----------------------------
-@bot.event
-async def on_command_error(ctx, error):
-    if isinstance(error, commands.MissingPermissions):
-        await ctx.reply("❌ You don’t have permission for that command (need **Manage Messages**).")
-        return
-    if isinstance(error, commands.MemberNotFound):
-        await ctx.reply("❌ I can’t find that user. Try mentioning them like `@name`.")
-        return
-    if isinstance(error, commands.MissingRequiredArgument):
-        await ctx.reply("❌ Missing info. Example: `!points remove @user 5 reason`")
-        return
-    if isinstance(error, commands.BadArgument):
-        await ctx.reply("❌ Bad format. Example: `!points remove @user 5 reason`")
-        return
-
-    # show generic error name (helps debugging without digging)
-    await ctx.reply(f"❌ Error: `{type(error).__name__}`")
-
-
-if __name__ == "__main__":
-    if not TOKEN:
-        raise SystemExit("Missing DISCORD_TOKEN environment variable.")
-    bot.run(TOKEN)
+import asyncio
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import shutil
+import signal
+import sys
+import sqlite3
+import time
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+
+TOKEN = os.getenv("DISCORD_TOKEN")  # set this in your environment
+
+COMMAND_PREFIX = "!"
+DB_FILE = "sorting_hat.sqlite3"
+
+HOUSES = ["Gryffindor", "Hufflepuff", "Ravenclaw", "Slytherin"]
+
+HOUSE_ROLE_COLORS = {
+    "Gryffindor": discord.Color.red(),
+    "Hufflepuff": discord.Color.gold(),
+    "Ravenclaw": discord.Color.blue(),
+    "Slytherin": discord.Color.green(),
+}
+
+intents = discord.Intents.default()
+intents.guilds = True
+intents.members = True
+intents.message_content = True
+intents.reactions = True
+
+# Low-memory mode keeps no member cache and skips chunking at startup; display names for
+# leaderboards come from the member_names table instead (see resolve_display_names).
+LOW_MEMORY_MODE = False
+
+# discord.py cache policy; low-memory mode overrides the member settings. Handlers use raw
+# events or fetch what they need, except that a deleted message can't be fetched: the
+# delete handlers read its author from the message cache to reverse legacy awards (ones
+# recorded before authors were stored), so keep a small one rather than none.
+MEMBER_CACHE_FLAGS = discord.MemberCacheFlags.from_intents(intents)  # e.g. MemberCacheFlags(voice=True, joined=False)
+CHUNK_GUILDS_AT_STARTUP = True
+MAX_MESSAGES: int | None = 200  # discord.py's default is 1000; None disables the legacy-author fallback
+
+if LOW_MEMORY_MODE:
+    MEMBER_CACHE_FLAGS = discord.MemberCacheFlags.none()
+    CHUNK_GUILDS_AT_STARTUP = False
+
+# role.members and the like are only complete when every member is cached.
+FULL_MEMBER_CACHE = CHUNK_GUILDS_AT_STARTUP and MEMBER_CACHE_FLAGS.joined
+
+
+def resolve_prefix(bot: commands.Bot, message: discord.Message) -> str:
+    return get_guild_settings(message.guild.id if message.guild else None).prefix
+
+
+bot = commands.Bot(
+    command_prefix=resolve_prefix,
+    intents=intents,
+    member_cache_flags=MEMBER_CACHE_FLAGS,
+    chunk_guilds_at_startup=CHUNK_GUILDS_AT_STARTUP,
+    max_messages=MAX_MESSAGES,
+)
+
+# ----------------------------
+# QUIZ CONFIG
+# ----------------------------
+QUIZ_TIMEOUT = 60  # seconds per question
+
+QUIZ_QUESTIONS = [
+    {
+        "q": "You see someone being bullied. What do you do?",
+        "options": {
+            "A": ("Step in immediately, even if it’s risky.", {"Gryffindor": 3, "Hufflepuff": 1}),
+            "B": ("Get help / rally people to stop it safely.", {"Hufflepuff": 3, "Ravenclaw": 1}),
+            "C": ("Assess the situation and plan the most effective move.", {"Ravenclaw": 3, "Slytherin": 1}),
+            "D": ("Use influence/pressure to make it stop—fast.", {"Slytherin": 3, "Gryffindor": 1}),
+        },
+    },
+    {
+        "q": "What do you value most?",
+        "options": {
+            "A": ("Bravery", {"Gryffindor": 3}),
+            "B": ("Loyalty", {"Hufflepuff": 3}),
+            "C": ("Knowledge", {"Ravenclaw": 3}),
+            "D": ("Ambition", {"Slytherin": 3}),
+        },
+    },
+    {
+        "q": "Pick a class you’d never skip:",
+        "options": {
+            "A": ("Defense Against the Dark Arts", {"Gryffindor": 2, "Slytherin": 1}),
+            "B": ("Herbology", {"Hufflepuff": 3}),
+            "C": ("Charms", {"Ravenclaw": 3}),
+            "D": ("Potions", {"Slytherin": 3}),
+        },
+    },
+    {
+        "q": "Your ideal weekend is:",
+        "options": {
+            "A": ("Adventure / exploring somewhere new", {"Gryffindor": 2, "Ravenclaw": 1}),
+            "B": ("Cozy time with friends/family", {"Hufflepuff": 3}),
+            "C": ("Learning something or a creative project", {"Ravenclaw": 3}),
+            "D": ("Working on goals / leveling up", {"Slytherin": 3}),
+        },
+    },
+]
+
+# ----------------------------
+# REACTION POINTS CONFIG
+# ----------------------------
+REACTION_POINTS = {
+    "❤️": 1,
+    "❤": 1,
+    "😂": 1,
+    "🤣": 1,
+    "😍": 1,
+    "👍": 1,
+    "💯": 1,  # <-- added
+    "😢": -1,
+    "😭": -1,
+    "👎": -1,
+}
+
+ALLOWED_REACTION_CHANNEL_IDS: set[int] = set()
+
+
+# ----------------------------
+# USER RECORD CACHE
+# ----------------------------
+USER_CACHE_SIZE = 20_000  # max (guild_id, user_id) records kept in memory
+
+_MISSING = object()
+
+
+class UserRecordCache:
+    """Bounded LRU of users rows keyed by (guild_id, user_id).
+
+    Rows are (house, points, sorted_at) exactly as get_user_record returns them; None is
+    cached too so lookups for members without a record don't hit SQLite every time.
+    Writers keep it current through put()/invalidate().
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[int, int], tuple | None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple[int, int]):
+        record = self._entries.get(key, _MISSING)
+        if record is _MISSING:
+            self.misses += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return record
+
+    def put(self, key: tuple[int, int], record: tuple | None):
+        self._entries[key] = record
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: tuple[int, int]):
+        self._entries.pop(key, None)
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+USER_CACHE = UserRecordCache(USER_CACHE_SIZE)
+
+
+# ----------------------------
+# OPERATION KEYS
+# ----------------------------
+OP_KEY_TTL = timedelta(days=2)  # how long a mutation's key blocks a replay
+OP_KEY_PRUNE_EVERY = 1000  # claims between prunes of expired keys
+BLOOM_BITS = 1 << 20  # 128 KiB; ~1% false positives at 100k live keys
+BLOOM_HASHES = 7
+
+
+class BloomFilter:
+    __slots__ = ("size", "hashes", "bits", "count")
+
+    def __init__(self, size: int = BLOOM_BITS, hashes: int = BLOOM_HASHES):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(size // 8)
+        self.count = 0
+
+    def _positions(self, key: int):
+        # Double hashing from two halves of one 128-bit digest.
+        digest = hashlib.blake2b(key.to_bytes(8, "little", signed=True), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: int):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: int) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class OperationKeys:
+    """Idempotency keys for point mutations, normally the invoking message's snowflake.
+
+    op_keys holds every key applied within OP_KEY_TTL; a Bloom filter over the same keys
+    answers "definitely new" in memory, so only the rare maybe-seen key costs a lookup.
+    Keys are snowflakes, so expiry is a range delete on the primary key.
+    """
+
+    def __init__(self):
+        self.bloom: BloomFilter | None = None
+        self.claims_since_prune = 0
+        self.duplicates = 0
+        self.lookups = 0
+
+    def _rebuild(self, cur: sqlite3.Cursor):
+        self.bloom = BloomFilter()
+        cur.execute("SELECT op_key FROM op_keys")
+        for (key,) in cur:
+            self.bloom.add(key)
+
+    def claim(self, cur: sqlite3.Cursor, key: int) -> bool:
+        """Record `key` inside the caller's transaction. False means it was already applied."""
+        if self.bloom is None:
+            self._rebuild(cur)
+        if key in self.bloom:
+            self.lookups += 1
+            cur.execute("SELECT 1 FROM op_keys WHERE op_key=?", (key,))
+            if cur.fetchone():
+                self.duplicates += 1
+                return False
+        cur.execute("INSERT INTO op_keys (op_key) VALUES (?)", (key,))
+        # Added before commit: a rolled-back claim only leaves a false positive behind.
+        self.bloom.add(key)
+        self.claims_since_prune += 1
+        return True
+
+    def prune_if_due(self, con: sqlite3.Connection):
+        if self.claims_since_prune < OP_KEY_PRUNE_EVERY:
+            return
+        self.claims_since_prune = 0
+        cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - OP_KEY_TTL)
+        cur = con.cursor()
+        cur.execute("DELETE FROM op_keys WHERE op_key < ?", (cutoff,))
+        con.commit()
+        if cur.rowcount:
+            self._rebuild(cur)  # Bloom filters can't forget; start over from what's left
+
+
+OP_KEYS = OperationKeys()
+
+
+# ----------------------------
+# DATABASE
+# ----------------------------
+def db():
+    return sqlite3.connect(DB_FILE)
+
+
+SCHEMA_VERSION = 1  # stored in PRAGMA user_version
+
+# points_log.kind. Reaction rows keep their provenance in message_id/emoji_id and leave
+# reason NULL; describe_log_entry() turns them back into text.
+LOG_MANUAL = 0
+LOG_REACTION_ADDED = 1
+LOG_REACTION_REMOVED = 2
+LOG_REACTION_CLEARED = 3
+
+_LOG_REACTION_PREFIXES = {
+    LOG_REACTION_ADDED: "Reaction ",
+    LOG_REACTION_REMOVED: "Removed reaction ",
+    LOG_REACTION_CLEARED: "Cleared reaction ",
+}
+
+
+_TABLES = {
+    "users": """
+        CREATE TABLE IF NOT EXISTS users (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            house TEXT,
+            points INTEGER NOT NULL DEFAULT 0,
+            sorted_at TEXT,
+            PRIMARY KEY (guild_id, user_id)
+        ) WITHOUT ROWID
+    """,
+    "points_log": """
+        CREATE TABLE IF NOT EXISTS points_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            target_user_id INTEGER NOT NULL,
+            moderator_user_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            reason TEXT,
+            created_at TEXT NOT NULL,
+            kind INTEGER NOT NULL DEFAULT 0,
+            message_id INTEGER,
+            emoji_id INTEGER
+        )
+    """,
+    "emojis": """
+        CREATE TABLE IF NOT EXISTS emojis (
+            id INTEGER PRIMARY KEY,
+            emoji TEXT NOT NULL UNIQUE
+        )
+    """,
+    # author_user_id is NULL only for awards recorded before it existed; reversing those
+    # needs the message author resolved some other way.
+    "reaction_awards": """
+        CREATE TABLE IF NOT EXISTS reaction_awards (
+            guild_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            reactor_user_id INTEGER NOT NULL,
+            emoji_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            author_user_id INTEGER,
+            PRIMARY KEY (guild_id, message_id, reactor_user_id, emoji_id)
+        ) WITHOUT ROWID
+    """,
+    "member_names": """
+        CREATE TABLE IF NOT EXISTS member_names (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            display_name TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (guild_id, user_id)
+        ) WITHOUT ROWID
+    """,
+    "term_schedules": """
+        CREATE TABLE IF NOT EXISTS term_schedules (
+            guild_id INTEGER PRIMARY KEY,
+            channel_id INTEGER,
+            interval_days INTEGER NOT NULL,
+            next_run_at TEXT NOT NULL
+        )
+    """,
+    "terms": """
+        CREATE TABLE IF NOT EXISTS terms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            cursor_user_id INTEGER NOT NULL DEFAULT 0,
+            started_at TEXT NOT NULL,
+            ended_at TEXT
+        )
+    """,
+    "term_standings": """
+        CREATE TABLE IF NOT EXISTS term_standings (
+            term_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            house TEXT,
+            points INTEGER NOT NULL,
+            PRIMARY KEY (term_id, user_id)
+        ) WITHOUT ROWID
+    """,
+    "op_keys": """
+        CREATE TABLE IF NOT EXISTS op_keys (
+            op_key INTEGER PRIMARY KEY
+        )
+    """,
+    "bot_meta": """
+        CREATE TABLE IF NOT EXISTS bot_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID
+    """,
+    "guild_settings": """
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            settings_json TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """,
+    "quiz_banks": """
+        CREATE TABLE IF NOT EXISTS quiz_banks (
+            guild_id INTEGER PRIMARY KEY,
+            bank_json TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """,
+}
+
+_INDEXES = [
+    # Serves leaderboard keyset pages and !rank counts in (points DESC, user_id) order.
+    "CREATE INDEX IF NOT EXISTS idx_users_leaderboard ON users (guild_id, points DESC, user_id)",
+    # Serves !history keyset pages: a range seek per page, newest id first.
+    "CREATE INDEX IF NOT EXISTS idx_points_log_target ON points_log (guild_id, target_user_id, id)",
+]
+
+
+def _create_tables(cur: sqlite3.Cursor):
+    for sql in _TABLES.values():
+        cur.execute(sql)
+    for sql in _INDEXES:
+        cur.execute(sql)
+
+
+def _table_columns(cur: sqlite3.Cursor, table: str) -> set[str]:
+    return {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+
+
+def _rebuild_without_rowid(cur: sqlite3.Cursor, table: str, select_sql: str):
+    """Swap a table for its WITHOUT ROWID definition in _TABLES, copying rows via select_sql."""
+    cur.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    cur.execute(_TABLES[table])
+    cur.execute(f"INSERT INTO {table} {select_sql.format(old=table + '_old')}")
+    cur.execute(f"DROP TABLE {table}_old")
+
+
+def _migrate_to_v1(cur: sqlite3.Cursor):
+    """Intern emoji, store reaction provenance as integers and drop rowids where the
+    primary key already identifies a row."""
+    tables = {name for (name,) in cur.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    cur.execute("DROP INDEX IF EXISTS idx_users_leaderboard")
+    cur.execute(_TABLES["emojis"])
+
+    if "reaction_awards" in tables:
+        author = "a.author_user_id" if "author_user_id" in _table_columns(cur, "reaction_awards") else "NULL"
+        cur.execute("INSERT OR IGNORE INTO emojis (emoji) SELECT DISTINCT emoji FROM reaction_awards")
+        _rebuild_without_rowid(cur, "reaction_awards", f"""
+            SELECT a.guild_id, a.message_id, a.reactor_user_id, e.id, a.delta, a.created_at, {author}
+            FROM {{old}} a JOIN emojis e ON e.emoji = a.emoji
+        """)
+    if "users" in tables:
+        _rebuild_without_rowid(cur, "users", "SELECT guild_id, user_id, house, points, sorted_at FROM {old}")
+    if "term_standings" in tables:
+        _rebuild_without_rowid(cur, "term_standings",
+                               "SELECT term_id, guild_id, user_id, house, points FROM {old}")
+
+    if "points_log" in tables:
+        columns = _table_columns(cur, "points_log")
+        if "kind" not in columns:
+            cur.execute("ALTER TABLE points_log ADD COLUMN kind INTEGER NOT NULL DEFAULT 0")
+            cur.execute("ALTER TABLE points_log ADD COLUMN message_id INTEGER")
+            cur.execute("ALTER TABLE points_log ADD COLUMN emoji_id INTEGER")
+
+        # "<prefix><emoji> on msg <id>" -> kind, emoji_id, message_id
+        for kind, prefix in _LOG_REACTION_PREFIXES.items():
+            start = len(prefix) + 1
+            match = f"""
+                kind = {LOG_MANUAL}
+                AND reason GLOB '{prefix}?* on msg [0-9]*'
+                AND substr(reason, instr(reason, ' on msg ') + 8) NOT GLOB '*[^0-9]*'
+            """
+            emoji = f"substr(reason, {start}, instr(reason, ' on msg ') - {start})"
+            cur.execute(f"INSERT OR IGNORE INTO emojis (emoji) SELECT DISTINCT {emoji} FROM points_log WHERE {match}")
+            cur.execute(f"""
+                UPDATE points_log SET
+                    kind = {kind},
+                    message_id = CAST(substr(reason, instr(reason, ' on msg ') + 8) AS INTEGER),
+                    emoji_id = (SELECT id FROM emojis WHERE emoji = {emoji}),
+                    reason = NULL
+                WHERE {match}
+            """)
+
+
+def init_db():
+    with db() as con:
+        cur = con.cursor()
+        # WAL lets backups and other readers run alongside point writes without blocking them.
+        cur.execute("PRAGMA journal_mode=WAL")
+        (version,) = cur.execute("PRAGMA user_version").fetchone()
+        if version >= SCHEMA_VERSION:
+            _create_tables(cur)
+        else:
+            cur.execute("BEGIN")
+            has_tables = cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='users'").fetchone()
+            if version < 1 and has_tables:
+                _migrate_to_v1(cur)
+            _create_tables(cur)
+            cur.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        con.commit()
+        load_emoji_ids(cur)
+
+
+# The emojis table is tiny (one row per emoji ever awarded), so it's mirrored in full at
+# startup and lookups of emojis that were never awarded don't need the database.
+EMOJI_IDS: dict[str, int] = {}
+EMOJI_NAMES: dict[int, str] = {}
+
+
+def load_emoji_ids(cur: sqlite3.Cursor):
+    EMOJI_IDS.clear()
+    EMOJI_NAMES.clear()
+    for emoji_id, emoji in cur.execute("SELECT id, emoji FROM emojis"):
+        EMOJI_IDS[emoji] = emoji_id
+        EMOJI_NAMES[emoji_id] = emoji
+
+
+def get_emoji_id(emoji: str) -> int:
+    """Interned id for an emoji string, creating it on first use."""
+    emoji_id = EMOJI_IDS.get(emoji)
+    if emoji_id is None:
+        with db() as con:
+            cur = con.cursor()
+            cur.execute("INSERT OR IGNORE INTO emojis (emoji) VALUES (?)", (emoji,))
+            cur.execute("SELECT id FROM emojis WHERE emoji=?", (emoji,))
+            (emoji_id,) = cur.fetchone()
+            con.commit()
+        EMOJI_IDS[emoji] = emoji_id
+        EMOJI_NAMES[emoji_id] = emoji
+    return emoji_id
+
+
+def find_emoji_id(emoji: str) -> int | None:
+    """Like get_emoji_id, but None (instead of a new id) for an emoji no award has ever used.
+
+    Answered from EMOJI_IDS alone: init_db loads the whole table and get_emoji_id, the
+    only writer, adds to it.
+    """
+    return EMOJI_IDS.get(emoji)
+
+
+def get_emoji_name(emoji_id: int) -> str:
+    emoji = EMOJI_NAMES.get(emoji_id)
+    if emoji is None:
+        with db() as con:
+            cur = con.cursor()
+            cur.execute("SELECT emoji FROM emojis WHERE id=?", (emoji_id,))
+            row = cur.fetchone()
+        emoji = row[0] if row else "?"
+        EMOJI_NAMES[emoji_id] = emoji
+        EMOJI_IDS.setdefault(emoji, emoji_id)
+    return emoji
+
+
+def describe_log_entry(kind: int, reason: str | None, message_id: int | None, emoji_id: int | None) -> str:
+    """Human-readable reason for a points_log row."""
+    if kind == LOG_MANUAL:
+        return reason or "no reason"
+    prefix = _LOG_REACTION_PREFIXES.get(kind, "Reaction ")
+    return f"{prefix}{get_emoji_name(emoji_id)} on msg {message_id}"
+
+
+def get_user_record(guild_id: int, user_id: int):
+    record = USER_CACHE.get((guild_id, user_id))
+    if record is not _MISSING:
+        return record
+
+    with db() as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT house, points, sorted_at FROM users WHERE guild_id=? AND user_id=?",
+            (guild_id, user_id),
+        )
+        record = cur.fetchone()
+    USER_CACHE.put((guild_id, user_id), record)
+    return record
+
+
+def set_user_house(guild_id: int, user_id: int, house: str):
+    now = datetime.utcnow().isoformat()
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("SELECT house FROM users WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+        previous = cur.fetchone()
+        cur.execute("""
+            INSERT INTO users (guild_id, user_id, house, points, sorted_at)
+            VALUES (?, ?, ?, 0, ?)
+            ON CONFLICT(guild_id, user_id) DO UPDATE SET house=excluded.house, sorted_at=excluded.sorted_at
+            RETURNING house, points, sorted_at
+        """, (guild_id, user_id, house, now))
+        record = cur.fetchone()
+        con.commit()
+    USER_CACHE.put((guild_id, user_id), record)
+    LEADERBOARD_CACHE.invalidate(guild_id)
+    HOUSE_COUNTS.moved(guild_id, previous[0] if previous else None, house)
+
+
+def _apply_points(cur: sqlite3.Cursor, guild_id: int, target_user_id: int, moderator_user_id: int, delta: int,
+                  reason: str | None, kind: int, message_id: int | None, emoji_id: int | None) -> tuple:
+    """Update the balance and log it inside the caller's transaction. Returns the new users row."""
+    cur.execute("""
+        INSERT INTO users (guild_id, user_id, house, points, sorted_at)
+        VALUES (?, ?, NULL, 0, NULL)
+        ON CONFLICT(guild_id, user_id) DO NOTHING
+    """, (guild_id, target_user_id))
+    cur.execute("""
+        UPDATE users SET points = points + ? WHERE guild_id=? AND user_id=?
+        RETURNING house, points, sorted_at
+    """, (delta, guild_id, target_user_id))
+    record = cur.fetchone()
+    cur.execute("""
+        INSERT INTO points_log (guild_id, target_user_id, moderator_user_id, delta, reason, created_at,
+                                kind, message_id, emoji_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (guild_id, target_user_id, moderator_user_id, delta, reason, datetime.utcnow().isoformat(),
+          kind, message_id, emoji_id))
+    return record
+
+
+def add_points(guild_id: int, target_user_id: int, moderator_user_id: int, delta: int, reason: str | None,
+               kind: int = LOG_MANUAL, message_id: int | None = None, emoji: str | None = None,
+               op_key: int | None = None) -> bool:
+    """Returns False (and changes nothing) if `op_key` was already applied."""
+    emoji_id = get_emoji_id(emoji) if emoji is not None else None
+    with db() as con:
+        cur = con.cursor()
+        if op_key is not None and not OP_KEYS.claim(cur, op_key):
+            return False
+        record = _apply_points(cur, guild_id, target_user_id, moderator_user_id, delta, reason,
+                               kind, message_id, emoji_id)
+        con.commit()
+        if op_key is not None:
+            OP_KEYS.prune_if_due(con)
+    USER_CACHE.put((guild_id, target_user_id), record)
+    LEADERBOARD_CACHE.invalidate(guild_id)
+    return True
+
+
+def add_points_bulk(guild_id: int, target_user_ids: list[int], moderator_user_id: int, delta: int,
+                    reason: str | None, op_key: int | None = None) -> bool:
+    """add_points for many members in one transaction: one executemany per statement.
+
+    Returns False (and changes nothing) if `op_key` was already applied.
+    """
+    now = datetime.utcnow().isoformat()
+    with db() as con:
+        cur = con.cursor()
+        if op_key is not None and not OP_KEYS.claim(cur, op_key):
+            return False
+        cur.executemany("""
+            INSERT INTO users (guild_id, user_id, house, points, sorted_at)
+            VALUES (?, ?, NULL, ?, NULL)
+            ON CONFLICT(guild_id, user_id) DO UPDATE SET points = points + excluded.points
+        """, [(guild_id, user_id, delta) for user_id in target_user_ids])
+        cur.executemany("""
+            INSERT INTO points_log (guild_id, target_user_id, moderator_user_id, delta, reason, created_at, kind)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(guild_id, user_id, moderator_user_id, delta, reason, now, LOG_MANUAL) for user_id in target_user_ids])
+        con.commit()
+        if op_key is not None:
+            OP_KEYS.prune_if_due(con)
+    for user_id in target_user_ids:
+        USER_CACHE.invalidate((guild_id, user_id))
+    if target_user_ids:
+        LEADERBOARD_CACHE.invalidate(guild_id)
+    return True
+
+
+def get_house_member_ids(guild_id: int, houses: list[str]) -> list[int]:
+    placeholders = ",".join("?" * len(houses))
+    with db() as con:
+        cur = con.cursor()
+        cur.execute(f"SELECT user_id FROM users WHERE guild_id=? AND house IN ({placeholders})",
+                    (guild_id, *houses))
+        return [user_id for (user_id,) in cur.fetchall()]
+
+
+# ----------------------------
+# GUILD SETTINGS
+# ----------------------------
+class GuildSettings:
+    """Effective settings for one guild: the module defaults with its overrides applied.
+
+    Overrides are stored as JSON in guild_settings; anything not overridden follows the
+    module globals. Houses themselves come from the guild's quiz bank.
+    """
+    __slots__ = ("overrides", "prefix", "quiz_timeout", "reaction_points", "reaction_channel_ids",
+                 "house_colors", "house_balancing")
+
+    def __init__(self, overrides: dict | None = None):
+        self.overrides = overrides or {}
+        self.prefix: str = self.overrides.get("prefix", COMMAND_PREFIX)
+        self.quiz_timeout: int = self.overrides.get("quiz_timeout", QUIZ_TIMEOUT)
+        self.reaction_points: dict[str, int] = self.overrides.get("reaction_points", REACTION_POINTS)
+        self.reaction_channel_ids: frozenset[int] = frozenset(
+            self.overrides.get("reaction_channel_ids", ALLOWED_REACTION_CHANNEL_IDS))
+        self.house_colors: dict[str, int] = {house: colour.value for house, colour in HOUSE_ROLE_COLORS.items()}
+        self.house_colors.update(self.overrides.get("house_colors", {}))
+        self.house_balancing: bool = self.overrides.get("house_balancing", HOUSE_BALANCING)
+
+    def house_colour(self, house: str) -> discord.Color:
+        value = self.house_colors.get(house)
+        return discord.Color(value) if value is not None else discord.Color.default()
+
+
+GUILD_SETTINGS: dict[int | None, GuildSettings] = {}
+
+
+def get_guild_settings(guild_id: int | None) -> GuildSettings:
+    """Loaded from the DB on first use per guild, then served from memory until changed."""
+    settings = GUILD_SETTINGS.get(guild_id)
+    if settings is None:
+        overrides = None
+        if guild_id is not None:
+            with db() as con:
+                cur = con.cursor()
+                cur.execute("SELECT settings_json FROM guild_settings WHERE guild_id=?", (guild_id,))
+                row = cur.fetchone()
+                overrides = json.loads(row[0]) if row else None
+        settings = GUILD_SETTINGS[guild_id] = GuildSettings(overrides)
+    return settings
+
+
+def update_guild_settings(guild_id: int, **changes) -> GuildSettings:
+    """Apply overrides (a value of None drops that override) and refresh the cached copy."""
+    overrides = dict(get_guild_settings(guild_id).overrides)
+    for key, value in changes.items():
+        if value is None:
+            overrides.pop(key, None)
+        else:
+            overrides[key] = value
+    with db() as con:
+        cur = con.cursor()
+        if overrides:
+            cur.execute("""
+                INSERT INTO guild_settings (guild_id, settings_json, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(guild_id) DO UPDATE SET settings_json=excluded.settings_json,
+                                                    updated_at=excluded.updated_at
+            """, (guild_id, json.dumps(overrides, ensure_ascii=False), datetime.utcnow().isoformat()))
+        else:
+            cur.execute("DELETE FROM guild_settings WHERE guild_id=?", (guild_id,))
+        con.commit()
+    settings = GUILD_SETTINGS[guild_id] = GuildSettings(overrides)
+    return settings
+
+
+async def get_or_create_role(guild: discord.Guild, house: str) -> discord.Role:
+    role = discord.utils.get(guild.roles, name=house)
+    if role:
+        return role
+    return await guild.create_role(
+        name=house,
+        colour=get_guild_settings(guild.id).house_colour(house),
+        reason="Sorting Hat: create house role",
+    )
+
+
+async def assign_house_role(member: discord.Member, house: str, houses: list[str] = HOUSES):
+    role = await get_or_create_role(member.guild, house)
+
+    other_roles = [r for r in member.roles if r.name in houses and r.name != house]
+    if other_roles:
+        await member.remove_roles(*other_roles, reason="Sorting Hat: changing house")
+
+    if role not in member.roles:
+        await member.add_roles(role, reason="Sorting Hat: assigned house")
+
+
+# ----------------------------
+# QUIZ BANKS
+# ----------------------------
+QUIZ_BANK_FILE = "quiz_bank.json"  # optional default bank; QUIZ_QUESTIONS is used if it's missing
+QUIZ_SUBSET_SIZE: int | None = None  # ask a random subset of this many questions (None = all)
+QUIZ_MAX_QUESTIONS = 60  # answers ride along in button custom_ids (100 chars max)
+QUIZ_MAX_OPTIONS = 5  # one row of buttons per question
+QUIZ_KEY_MAX_LENGTH = 80  # option keys become button labels (Discord's limit)
+QUIZ_SEED_BITS = 31  # quiz seeds are drawn with random.getrandbits(QUIZ_SEED_BITS)
+CUSTOM_ID_MAX_LENGTH = 100  # Discord's limit for a component custom_id
+QUIZ_ID_PREFIX = "sortquiz"  # custom_id prefix of every quiz button (format under QUIZ ENGINE)
+
+
+class QuizBank:
+    """A quiz compiled into a question × option × house weight matrix.
+
+    Banks use the same shape as QUIZ_QUESTIONS:
+    {"houses": [...], "subset_size": 4 or null,
+     "questions": [{"q": "...", "options": {"A": ["text", {"House": 3, ...}], ...}}, ...]}
+    """
+    __slots__ = ("houses", "questions", "weights", "leaders", "subset_size", "version")
+
+    def __init__(self, data: dict):
+        houses = data.get("houses") or []
+        if isinstance(houses, str) or not all(isinstance(house, str) and house for house in houses):
+            raise ValueError("houses must be a list of house names.")
+        self.houses: list[str] = list(houses)
+        if not self.houses or len(set(self.houses)) != len(self.houses):
+            raise ValueError("Bank needs a list of distinct houses.")
+
+        raw_questions = data.get("questions") or []
+        if not 0 < len(raw_questions) <= QUIZ_MAX_QUESTIONS:
+            raise ValueError(f"Bank needs 1–{QUIZ_MAX_QUESTIONS} questions.")
+
+        house_index = {house: i for i, house in enumerate(self.houses)}
+        self.questions: list[tuple[str, list[tuple[str, str]]]] = []
+        self.weights: list[list[tuple[int, ...]]] = []  # [question][option] -> per-house weights
+        self.leaders: list[list[int | None]] = []  # [question][option] -> house it favours most
+        for number, item in enumerate(raw_questions, start=1):
+            options = item.get("options") or {}
+            if not 2 <= len(options) <= QUIZ_MAX_OPTIONS:
+                raise ValueError(f"Question {number} needs 2–{QUIZ_MAX_OPTIONS} options.")
+            texts, rows, leaders = [], [], []
+            for key, (option_text, weights) in options.items():
+                if not 0 < len(key) <= QUIZ_KEY_MAX_LENGTH:
+                    raise ValueError(f"Question {number} option keys must be 1–{QUIZ_KEY_MAX_LENGTH} characters.")
+                row = [0] * len(self.houses)
+                for house, pts in weights.items():
+                    if house not in house_index:
+                        raise ValueError(f"Question {number} option {key} scores unknown house {house!r}.")
+                    row[house_index[house]] = int(pts)
+                texts.append((key, option_text))
+                rows.append(tuple(row))
+                leaders.append(row.index(max(row)) if max(row) > 0 else None)
+            self.questions.append((item["q"], texts))
+            self.weights.append(rows)
+            self.leaders.append(leaders)
+
+        subset_size = data.get("subset_size")
+        if subset_size is not None and not 0 < subset_size <= len(self.questions):
+            raise ValueError("subset_size must be between 1 and the number of questions.")
+        self.subset_size = subset_size
+
+        canonical = json.dumps([self.houses, raw_questions, subset_size], sort_keys=True, ensure_ascii=False)
+        self.version = f"{zlib.crc32(canonical.encode()):08x}"
+
+        # The longest answer button: a re-sort with the biggest seed and one digit per question asked.
+        asked = subset_size or len(self.questions)
+        longest_id = f"{QUIZ_ID_PREFIX}:r:{self.version}:{2 ** QUIZ_SEED_BITS - 1}:{'0' * asked}"
+        if len(longest_id) > CUSTOM_ID_MAX_LENGTH:
+            raise ValueError(f"Too many questions per quiz ({asked}) for a {CUSTOM_ID_MAX_LENGTH}-character "
+                             "button id; lower subset_size.")
+
+    def question_order(self, seed: int) -> list[int]:
+        """Question indices asked for a quiz seed: a random subset if configured, else all in order."""
+        if self.subset_size is None or self.subset_size == len(self.questions):
+            return list(range(len(self.questions)))
+        return random.Random(seed).sample(range(len(self.questions)), self.subset_size)
+
+    def score(self, chosen: list[tuple[int, int]]) -> list[int]:
+        """Per-house totals for (question, option) picks: a column sum over the chosen weight rows."""
+        rows = [self.weights[q][o] for q, o in chosen]
+        if not rows:
+            return [0] * len(self.houses)
+        return [sum(column) for column in zip(*rows)]
+
+    def pick_house(self, scores: list[int], chosen: list[tuple[int, int]], rng: random.Random | None = None) -> str:
+        """Highest-scoring house. Ties go to a weighted draw (from `rng`, else the module's
+        generator) favouring the tied house that the user's answers led with most often."""
+        best = max(scores)
+        tied = [i for i, score in enumerate(scores) if score == best]
+        if len(tied) == 1:
+            return self.houses[tied[0]]
+        leads = Counter(self.leaders[q][o] for q, o in chosen)
+        choices = rng.choices if rng is not None else random.choices
+        return self.houses[choices(tied, weights=[leads[i] + 1 for i in tied])[0]]
+
+
+def default_quiz_bank_data() -> dict:
+    if os.path.exists(QUIZ_BANK_FILE):
+        with open(QUIZ_BANK_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {"houses": HOUSES, "questions": QUIZ_QUESTIONS, "subset_size": QUIZ_SUBSET_SIZE}
+
+
+QUIZ_BANKS: dict[int, QuizBank] = {}
+
+
+def get_guild_quiz_bank_data(guild_id: int) -> dict | None:
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("SELECT bank_json FROM quiz_banks WHERE guild_id=?", (guild_id,))
+        row = cur.fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def save_guild_quiz_bank(guild_id: int, data: dict | None):
+    with db() as con:
+        cur = con.cursor()
+        if data is None:
+            cur.execute("DELETE FROM quiz_banks WHERE guild_id=?", (guild_id,))
+        else:
+            cur.execute("""
+                INSERT INTO quiz_banks (guild_id, bank_json, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(guild_id) DO UPDATE SET bank_json=excluded.bank_json, updated_at=excluded.updated_at
+            """, (guild_id, json.dumps(data, ensure_ascii=False), datetime.utcnow().isoformat()))
+        con.commit()
+    QUIZ_BANKS.pop(guild_id, None)
+
+
+def get_quiz_bank(guild_id: int) -> QuizBank:
+    """Compiled bank for a guild: its own from quiz_banks, or the default."""
+    bank = QUIZ_BANKS.get(guild_id)
+    if bank is None:
+        bank = QUIZ_BANKS[guild_id] = QuizBank(get_guild_quiz_bank_data(guild_id) or default_quiz_bank_data())
+    return bank
+
+
+# ----------------------------
+# HOUSE BALANCING
+# ----------------------------
+HOUSE_BALANCING = False  # steer close results toward under-filled houses (default; per guild via !settings)
+BALANCE_MARGIN = 2  # houses scoring within this many points of the best count as "close"
+HOUSE_TARGET_RATIOS: dict[str, float] = {}  # e.g. {"Gryffindor": 2, ...}; empty/missing = even split
+
+
+class HouseCounts:
+    """Live per-guild house populations.
+
+    A guild's counts are read with one GROUP BY the first time they're needed and from
+    then on kept in step by set_user_house, so sorting never re-counts the users table.
+    """
+
+    def __init__(self):
+        self._guilds: dict[int, Counter] = {}
+
+    def get(self, guild_id: int) -> Counter:
+        counts = self._guilds.get(guild_id)
+        if counts is None:
+            with db() as con:
+                cur = con.cursor()
+                cur.execute("""
+                    SELECT house, COUNT(*) FROM users
+                    WHERE guild_id=? AND house IS NOT NULL
+                    GROUP BY house
+                """, (guild_id,))
+                counts = self._guilds[guild_id] = Counter(dict(cur.fetchall()))
+        return counts
+
+    def moved(self, guild_id: int, old_house: str | None, new_house: str | None):
+        counts = self._guilds.get(guild_id)
+        if counts is None or old_house == new_house:
+            return
+        if old_house:
+            counts[old_house] -= 1
+        if new_house:
+            counts[new_house] += 1
+
+
+HOUSE_COUNTS = HouseCounts()
+
+
+def house_targets(houses: list[str]) -> dict[str, float]:
+    weights = {house: HOUSE_TARGET_RATIOS.get(house, 1.0 if not HOUSE_TARGET_RATIOS else 0.0) for house in houses}
+    total = sum(weights.values()) or len(houses)
+    return {house: weight / total for house, weight in weights.items()}
+
+
+def pick_balanced_house(bank: QuizBank, scores: list[int], chosen: list[tuple[int, int]], counts: Counter,
+                        margin: int = BALANCE_MARGIN, rng: random.Random | None = None) -> str:
+    """Like QuizBank.pick_house, but among houses within `margin` of the best score pick
+    the one furthest below its target share of the guild."""
+    best = max(scores)
+    close = [i for i, score in enumerate(scores) if score >= best - margin]
+    if len(close) == 1:
+        return bank.houses[close[0]]
+
+    targets = house_targets(bank.houses)
+    population = sum(counts[house] for house in bank.houses) + 1
+
+    def deficit(i: int) -> float:
+        house = bank.houses[i]
+        return targets[house] * population - counts[house]
+
+    neediest = max(deficit(i) for i in close)
+    candidates = [i for i in close if deficit(i) == neediest]
+    if len(candidates) == 1:
+        return bank.houses[candidates[0]]
+    # Equally under-filled: fall back to the normal scoring/tie-break among just those.
+    masked = [score if i in candidates else best - margin - 1 for i, score in enumerate(scores)]
+    return bank.pick_house(masked, chosen, rng)
+
+
+# ----------------------------
+# QUIZ ENGINE
+# ----------------------------
+# The quiz runs on ephemeral button messages. Everything the bot needs to continue is
+# carried in each button's custom_id, so no per-user state or coroutine is kept:
+#   sortquiz:start:<mode>:<user_id or 0>[:<expires>]  start button (0 = anyone may press it)
+#   sortquiz:<mode>:<bank version>:<seed>:<answers>   answer button
+# mode is "s" for a first sorting and "r" for an admin-approved re-sort. The seed picks
+# the question order/subset and answers holds one option index digit per question asked.
+# Re-sort start buttons carry a unix deadline, and an approval is spent once the member
+# has been sorted after the message (or the quiz) was posted.
+RESORT_APPROVAL_TTL = 24 * 60 * 60  # seconds a !resort button stays usable
+
+
+def sorted_since(guild_id: int, user_id: int, moment: datetime) -> bool:
+    """True if the member was (re-)sorted after `moment`, i.e. a re-sort approved before then is spent."""
+    record = get_user_record(guild_id, user_id)
+    return bool(record and record[2]) and datetime.fromisoformat(record[2]) > as_naive_utc(moment)
+
+
+async def run_quiz_interaction(interaction: discord.Interaction, handler):
+    if interaction.guild_id is None:
+        return
+    if not LIFECYCLE.accepting:
+        # Nothing is lost: the quiz lives in the buttons, so pressing again after the restart works.
+        await interaction.response.send_message("🔁 The Sorting Hat is restarting — press again in a few seconds.",
+                                                ephemeral=True)
+        return
+    async with LIFECYCLE.track():
+        await handler(interaction)
+
+
+class QuizStartButton(discord.ui.DynamicItem[discord.ui.Button],
+                      template=rf"{QUIZ_ID_PREFIX}:start:(?P<mode>[sr]):(?P<user_id>\d+)(?::(?P<expires>\d+))?"):
+    """The "Put on the Sorting Hat" button. Re-sort buttons carry a deadline and are spent once used."""
+
+    def __init__(self, mode: str, user_id: int = 0, expires: int = 0):
+        custom_id = f"{QUIZ_ID_PREFIX}:start:{mode}:{user_id}" + (f":{expires}" if expires else "")
+        super().__init__(discord.ui.Button(
+            label="Put on the Sorting Hat",
+            emoji="🪄",
+            style=discord.ButtonStyle.primary,
+            custom_id=custom_id,
+        ))
+        self.mode = mode
+        self.user_id = user_id
+        self.expires = expires
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: re.Match[str]):
+        return cls(match["mode"], int(match["user_id"]), int(match["expires"] or 0))
+
+    async def callback(self, interaction: discord.Interaction):
+        await run_quiz_interaction(interaction, self._start)
+
+    async def _start(self, interaction: discord.Interaction):
+        if self.user_id and self.user_id != interaction.user.id:
+            await interaction.response.send_message("🎩 This hat is waiting for someone else.", ephemeral=True)
+            return
+        if self.mode == "r" and (
+                not self.expires or time.time() > self.expires
+                or sorted_since(interaction.guild_id, interaction.user.id, interaction.message.created_at)):
+            prefix = get_guild_settings(interaction.guild_id).prefix
+            await interaction.response.send_message(
+                f"⌛ This re-sort has expired or was already used. Ask an admin for a new `{prefix}resort`.",
+                ephemeral=True,
+            )
+            return
+        await start_sorting_quiz(interaction, self.mode)
+
+
+class QuizAnswerButton(discord.ui.DynamicItem[discord.ui.Button],
+                       template=rf"{QUIZ_ID_PREFIX}:(?P<mode>[sr]):(?P<version>[0-9a-f]+):(?P<seed>\d+):"
+                                r"(?P<answers>\d+)"):
+    """One answer option; the custom_id holds the whole quiz so far (see the format above)."""
+
+    def __init__(self, label: str, mode: str, version: str, seed: int, answers: str):
+        super().__init__(discord.ui.Button(
+            label=label,
+            style=discord.ButtonStyle.secondary,
+            custom_id=f"{QUIZ_ID_PREFIX}:{mode}:{version}:{seed}:{answers}",
+        ))
+        self.mode = mode
+        self.version = version
+        self.seed = seed
+        self.answers = answers
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: re.Match[str]):
+        return cls(item.label, match["mode"], match["version"], int(match["seed"]), match["answers"])
+
+    async def callback(self, interaction: discord.Interaction):
+        await run_quiz_interaction(interaction, self._answer)
+
+    async def _answer(self, interaction: discord.Interaction):
+        await handle_quiz_answer(interaction, self.mode, self.version, self.seed, self.answers)
+
+
+# The buttons are routed by custom_id pattern, so the views carrying them are never kept in
+# discord.py's view store and a restart doesn't break quizzes that are mid-way.
+bot.add_dynamic_items(QuizStartButton, QuizAnswerButton)
+
+
+def quiz_start_view(mode: str, user_id: int = 0) -> discord.ui.View:
+    expires = int(time.time()) + RESORT_APPROVAL_TTL if mode == "r" else 0
+    view = discord.ui.View(timeout=None)
+    view.add_item(QuizStartButton(mode, user_id, expires))
+    return view
+
+
+def quiz_question_message(bank: QuizBank, mode: str, seed: int, answers: str) -> tuple[str, discord.ui.View]:
+    order = bank.question_order(seed)
+    text, options = bank.questions[order[len(answers)]]
+    opts_text = "\n".join([f"**{key}** — {option_text}" for key, option_text in options])
+    content = f"**Q{len(answers) + 1}/{len(order)}.** {text}\n{opts_text}"
+
+    view = discord.ui.View(timeout=None)
+    for index, (key, _) in enumerate(options):
+        view.add_item(QuizAnswerButton(key, mode, bank.version, seed, f"{answers}{index}"))
+    return content, view
+
+
+async def start_sorting_quiz(interaction: discord.Interaction, mode: str):
+    """Answer an interaction with the first question as an ephemeral message."""
+    bank = get_quiz_bank(interaction.guild_id)
+    if mode == "s":
+        record = get_user_record(interaction.guild_id, interaction.user.id)
+        if record and record[0] in bank.houses:
+            prefix = get_guild_settings(interaction.guild_id).prefix
+            await interaction.response.send_message(
+                f"🪄 You’re already sorted into **{record[0]}**! Ask an admin for `{prefix}resort` "
+                "if you want to re-sort.",
+                ephemeral=True,
+            )
+            return
+
+    content, view = quiz_question_message(bank, mode, random.getrandbits(QUIZ_SEED_BITS), "")
+    await interaction.response.send_message(content, view=view, ephemeral=True)
+
+
+async def handle_quiz_answer(interaction: discord.Interaction, mode: str, version: str, seed: int, answers: str):
+    bank = get_quiz_bank(interaction.guild_id)
+    settings = get_guild_settings(interaction.guild_id)
+    order = bank.question_order(seed)
+    if (version != bank.version or len(answers) > len(order)
+            or any(int(a) >= len(bank.questions[q][1]) for q, a in zip(order, answers))):
+        await interaction.response.edit_message(content="❌ This quiz is out of date. Run `/sort` again.", view=None)
+        return
+
+    started = interaction.message.created_at if interaction.message else discord.utils.utcnow()
+    if (discord.utils.utcnow() - started).total_seconds() > settings.quiz_timeout * len(order):
+        await interaction.response.edit_message(content="⌛ Time’s up. Run `/sort` again when you’re ready.",
+                                                view=None)
+        return
+
+    if len(answers) < len(order):
+        content, view = quiz_question_message(bank, mode, seed, answers)
+        await interaction.response.edit_message(content=content, view=view)
+        return
+
+    member = interaction.user
+    record = get_user_record(interaction.guild_id, member.id)
+    if mode == "s" and record and record[0] in bank.houses:
+        await interaction.response.edit_message(content=f"🪄 You’re already sorted into **{record[0]}**!", view=None)
+        return
+    if mode == "r" and sorted_since(interaction.guild_id, member.id, started):
+        # Another quiz from the same approval finished first.
+        await interaction.response.edit_message(content="⌛ This re-sort was already used.", view=None)
+        return
+
+    chosen = [(q, int(a)) for q, a in zip(order, answers)]
+    scores = bank.score(chosen)
+    if settings.house_balancing:
+        house = pick_balanced_house(bank, scores, chosen, HOUSE_COUNTS.get(interaction.guild_id))
+    else:
+        house = bank.pick_house(scores, chosen)
+    set_user_house(interaction.guild_id, member.id, house)
+    await interaction.response.edit_message(content=f"✨ The Sorting Hat has decided… **{house}**!", view=None)
+
+    try:
+        await assign_house_role(member, house, bank.houses)
+    except discord.Forbidden:
+        pass
+    if mode == "r":
+        announcement = f"🔁 Re-sorted **{member.display_name}** into **{house}**"
+    else:
+        announcement = f"✨ The Sorting Hat has spoken! **{member.display_name}** → **{house}**"
+    await interaction.followup.send(announcement)
+
+
+# ----------------------------
+# REST LOOKUPS
+# ----------------------------
+CHANNEL_FETCH_TTL = 300  # seconds a fetched channel/thread is reused
+MESSAGE_FETCH_TTL = 60  # seconds a fetched message is reused (we only read its author)
+NEGATIVE_FETCH_TTL = 60  # seconds a NotFound/Forbidden answer is reused
+FETCH_CACHE_SIZE = 5_000  # entries per kind
+
+
+class SingleFlight:
+    """Coalesces concurrent REST fetches of the same id and caches the outcome.
+
+    While a fetch is in flight, other callers for that id await the same task instead
+    of sending their own request. Results are kept for `ttl` seconds; NotFound and
+    Forbidden are kept for NEGATIVE_FETCH_TTL and re-raised. Other HTTP errors are
+    transient and are never cached.
+    """
+
+    def __init__(self, ttl: float, max_size: int = FETCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache: OrderedDict[int, tuple[float, object, Exception | None]] = OrderedDict()
+        self._in_flight: dict[int, asyncio.Task] = {}
+        self.fetches = 0
+        self.hits = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _store(self, key: int, ttl: float, result, error: Exception | None):
+        self._cache[key] = (time.monotonic() + ttl, result, error)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def forget(self, key: int):
+        self._cache.pop(key, None)
+
+    async def get(self, key: int, fetch):
+        """Return the cached result for `key`, or await `fetch()` once for all concurrent callers."""
+        entry = self._cache.get(key)
+        if entry is not None:
+            expires, result, error = entry
+            if expires > time.monotonic():
+                self.hits += 1
+                if error is not None:
+                    raise error.with_traceback(None)
+                return result
+            del self._cache[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.fetches += 1
+            task = self._in_flight[key] = asyncio.ensure_future(self._fetch(key, fetch))
+            # Nobody may be left to see the outcome if every caller was cancelled.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        # The fetch runs in its own task, so a cancelled caller (even the first) only stops waiting.
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: int, fetch):
+        try:
+            result = await fetch()
+        except (discord.NotFound, discord.Forbidden) as e:
+            self._store(key, NEGATIVE_FETCH_TTL, None, e)
+            raise
+        else:
+            self._store(key, self.ttl, result, None)
+            return result
+        finally:
+            del self._in_flight[key]
+
+
+CHANNEL_FETCHES = SingleFlight(CHANNEL_FETCH_TTL)
+MESSAGE_FETCHES = SingleFlight(MESSAGE_FETCH_TTL)
+
+
+async def resolve_channel(guild: discord.Guild, channel_id: int):
+    """Cached channel, or one coalesced fetch_channel (threads usually aren't in guild.channels)."""
+    channel = guild.get_channel(channel_id)
+    if channel is None:
+        channel = await CHANNEL_FETCHES.get(channel_id, lambda: bot.fetch_channel(channel_id))
+    return channel
+
+
+async def resolve_message(channel, message_id: int) -> discord.Message:
+    return await MESSAGE_FETCHES.get(message_id, lambda: channel.fetch_message(message_id))
+
+
+# ----------------------------
+# REACTION AWARDS HELPERS
+# ----------------------------
+def _emoji_key(payload_emoji: discord.PartialEmoji) -> str:
+    return str(payload_emoji)
+
+
+def record_reaction_award(guild_id: int, message_id: int, reactor_id: int, author_id: int,
+                          emoji: str, delta: int) -> bool:
+    """Store the award and credit the author in one transaction.
+
+    The award's primary key (message, reactor, emoji) is the operation key: a replayed
+    event inserts nothing and so credits nothing. Returns False for a duplicate.
+    """
+    emoji_id = get_emoji_id(emoji)
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            INSERT INTO reaction_awards (guild_id, message_id, reactor_user_id, emoji_id, delta, created_at,
+                                         author_user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        """, (guild_id, message_id, reactor_id, emoji_id, delta, datetime.utcnow().isoformat(), author_id))
+        if not cur.rowcount:
+            return False
+        record = _apply_points(cur, guild_id, author_id, reactor_id, delta, None,
+                               LOG_REACTION_ADDED, message_id, emoji_id)
+        con.commit()
+    USER_CACHE.put((guild_id, author_id), record)
+    LEADERBOARD_CACHE.invalidate(guild_id)
+    return True
+
+
+def remove_reaction_award(guild_id: int, message_id: int, reactor_id: int,
+                          emoji: str) -> tuple[int, int | None] | None:
+    """Delete the award and, when its author is known, debit them in the same transaction.
+
+    Returns (delta, author_user_id), or None if there was no award. A None author means a
+    legacy row: the caller has to look the author up and apply the reversal itself.
+    """
+    emoji_id = find_emoji_id(emoji)
+    if emoji_id is None:
+        return None
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            DELETE FROM reaction_awards
+            WHERE guild_id=? AND message_id=? AND reactor_user_id=? AND emoji_id=?
+            RETURNING delta, author_user_id
+        """, (guild_id, message_id, reactor_id, emoji_id))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        delta, author_id = row
+        record = None
+        if author_id is not None:
+            record = _apply_points(cur, guild_id, author_id, reactor_id, -delta, None,
+                                   LOG_REACTION_REMOVED, message_id, emoji_id)
+        con.commit()
+    if record is not None:
+        USER_CACHE.put((guild_id, author_id), record)
+        LEADERBOARD_CACHE.invalidate(guild_id)
+    return delta, author_id
+
+
+def has_legacy_reaction_awards(guild_id: int, message_id: int) -> bool:
+    """True if some award on the message was stored without its author."""
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT 1 FROM reaction_awards
+            WHERE guild_id=? AND message_id=? AND author_user_id IS NULL
+            LIMIT 1
+        """, (guild_id, message_id))
+        return cur.fetchone() is not None
+
+
+def reverse_reaction_awards(guild_id: int, message_ids: list[int], emoji: str | None = None,
+                            fallback_authors: dict[int, int] | None = None) -> dict[int, int]:
+    """Delete all awards on the given messages (optionally only one emoji) and take their
+    points back in a single transaction. Returns the net point change per user."""
+    if not message_ids:
+        return {}
+    fallback_authors = fallback_authors or {}
+    now = datetime.utcnow().isoformat()
+
+    placeholders = ",".join("?" * len(message_ids))
+    sql = f"DELETE FROM reaction_awards WHERE guild_id=? AND message_id IN ({placeholders})"
+    params: list = [guild_id, *message_ids]
+    if emoji is not None:
+        emoji_id = find_emoji_id(emoji)
+        if emoji_id is None:
+            return {}
+        sql += " AND emoji_id=?"
+        params.append(emoji_id)
+    sql += " RETURNING message_id, reactor_user_id, author_user_id, emoji_id, delta"
+
+    with db() as con:
+        cur = con.cursor()
+        rows = cur.execute(sql, params).fetchall()
+
+        user_deltas: dict[int, int] = {}
+        log_rows = []
+        for message_id, reactor_id, author_id, emoji_id, delta in rows:
+            if author_id is None:
+                author_id = fallback_authors.get(message_id)
+            if author_id is None:
+                # Legacy award on a message we can no longer resolve; nothing to take back from.
+                continue
+            user_deltas[author_id] = user_deltas.get(author_id, 0) - delta
+            log_rows.append((guild_id, author_id, reactor_id, -delta, now,
+                             LOG_REACTION_CLEARED, message_id, emoji_id))
+
+        user_deltas = {user_id: delta for user_id, delta in user_deltas.items() if delta}
+        cur.executemany("""
+            UPDATE users SET points = points + ? WHERE guild_id=? AND user_id=?
+        """, [(delta, guild_id, user_id) for user_id, delta in user_deltas.items()])
+        cur.executemany("""
+            INSERT INTO points_log (guild_id, target_user_id, moderator_user_id, delta, created_at,
+                                    kind, message_id, emoji_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, log_rows)
+        con.commit()
+
+    for user_id in user_deltas:
+        USER_CACHE.invalidate((guild_id, user_id))
+    if user_deltas:
+        LEADERBOARD_CACHE.invalidate(guild_id)
+    return user_deltas
+
+
+async def _legacy_award_authors(guild_id: int, channel_id: int, message_id: int) -> dict[int, int]:
+    """Resolve the author of a message only when some of its awards predate author tracking."""
+    if not has_legacy_reaction_awards(guild_id, message_id):
+        return {}
+
+    guild = bot.get_guild(guild_id)
+    if guild is None:
+        return {}
+
+    try:
+        channel = await resolve_channel(guild, channel_id)
+        message = await resolve_message(channel, message_id)
+    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+        return {}
+
+    return {message_id: message.author.id}
+
+
+# ----------------------------
+# DISPLAY NAMES
+# ----------------------------
+NAME_CACHE_TTL = timedelta(days=3)  # refresh stored display names older than this
+QUERY_MEMBERS_LIMIT = 100  # user_ids per gateway member request (Discord's cap)
+
+
+def get_cached_display_names(guild_id: int, user_ids: list[int]) -> dict[int, tuple[str, str]]:
+    """Stored (display_name, updated_at) for the given users."""
+    if not user_ids:
+        return {}
+    placeholders = ",".join("?" * len(user_ids))
+    with db() as con:
+        cur = con.cursor()
+        cur.execute(f"""
+            SELECT user_id, display_name, updated_at
+            FROM member_names
+            WHERE guild_id=? AND user_id IN ({placeholders})
+        """, (guild_id, *user_ids))
+        return {user_id: (name, updated_at) for user_id, name, updated_at in cur.fetchall()}
+
+
+def remember_display_names(guild_id: int, names: dict[int, str]):
+    if not names:
+        return
+    now = datetime.utcnow().isoformat()
+    with db() as con:
+        cur = con.cursor()
+        cur.executemany("""
+            INSERT INTO member_names (guild_id, user_id, display_name, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(guild_id, user_id) DO UPDATE SET
+                display_name=excluded.display_name, updated_at=excluded.updated_at
+        """, [(guild_id, user_id, name, now) for user_id, name in names.items()])
+        con.commit()
+
+
+async def resolve_display_names(guild: discord.Guild, user_ids: list[int]) -> dict[int, str]:
+    """Display names for a batch of users without relying on a full member cache.
+
+    Cached members are used as-is; everyone else comes from member_names, and the
+    missing or stale ones are refreshed with a single query_members request. Users we
+    still can't resolve are left out so callers can fall back to a mention.
+    """
+    names: dict[int, str] = {}
+    for user_id in user_ids:
+        member = guild.get_member(user_id)
+        if member is not None:
+            names[user_id] = member.display_name
+
+    unresolved = [user_id for user_id in user_ids if user_id not in names]
+    stored = get_cached_display_names(guild.id, unresolved)
+    stale_before = (datetime.utcnow() - NAME_CACHE_TTL).isoformat()
+    refresh = []
+    for user_id in unresolved:
+        if user_id in stored:
+            name, updated_at = stored[user_id]
+            names[user_id] = name
+            if updated_at >= stale_before:
+                continue
+        refresh.append(user_id)
+
+    if refresh:
+        try:
+            members = await guild.query_members(user_ids=refresh[:QUERY_MEMBERS_LIMIT], cache=False)
+        except (asyncio.TimeoutError, discord.ClientException):
+            members = []
+        fresh = {member.id: member.display_name for member in members}
+        remember_display_names(guild.id, fresh)
+        names.update(fresh)
+
+    return names
+
+
+# ----------------------------
+# LEADERBOARD
+# ----------------------------
+LEADERBOARD_PAGE_SIZE = 10
+LEADERBOARD_MAX_PAGE_SIZE = 25
+LEADERBOARD_CACHE_GUILDS = 500  # guilds whose page cursors/renders are kept
+LEADERBOARD_VIEW_TIMEOUT = 120  # seconds the page buttons stay active
+
+
+class LeaderboardPages:
+    __slots__ = ("cursors", "pages", "members")
+
+    def __init__(self):
+        self.cursors: list[tuple[int, int] | None] = [None]
+        self.pages: dict[int, str] = {}
+        self.members: int | None = None  # ranked rows, counted on first use
+
+
+class LeaderboardCache:
+    """Per-guild page cursors and rendered pages.
+
+    For each page size, cursors[i] is the (points, user_id) of the last row before
+    page i (None for the first page), so any page we've seen a neighbour of can be
+    fetched with a keyset query instead of OFFSET. Everything for a guild is dropped
+    whenever its points or houses change.
+    """
+
+    def __init__(self, max_guilds: int):
+        self.max_guilds = max_guilds
+        self._guilds: OrderedDict[int, dict[int, LeaderboardPages]] = OrderedDict()
+
+    def state(self, guild_id: int, page_size: int) -> LeaderboardPages:
+        sizes = self._guilds.get(guild_id)
+        if sizes is None:
+            sizes = self._guilds[guild_id] = {}
+            while len(self._guilds) > self.max_guilds:
+                self._guilds.popitem(last=False)
+        self._guilds.move_to_end(guild_id)
+        state = sizes.get(page_size)
+        if state is None:
+            state = sizes[page_size] = LeaderboardPages()
+        return state
+
+    def invalidate(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+
+LEADERBOARD_CACHE = LeaderboardCache(LEADERBOARD_CACHE_GUILDS)
+
+
+def fetch_leaderboard_rows(guild_id: int, after: tuple[int, int] | None, limit: int) -> list[tuple]:
+    """Rows (user_id, points, house) ranked after the given (points, user_id) cursor."""
+    with db() as con:
+        cur = con.cursor()
+        if after is None:
+            cur.execute("""
+                SELECT user_id, points, house
+                FROM users
+                WHERE guild_id=?
+                ORDER BY points DESC, user_id
+                LIMIT ?
+            """, (guild_id, limit))
+        else:
+            after_points, after_user_id = after
+            cur.execute("""
+                SELECT user_id, points, house
+                FROM users
+                WHERE guild_id=? AND points <= ? AND (points < ? OR user_id > ?)
+                ORDER BY points DESC, user_id
+                LIMIT ?
+            """, (guild_id, after_points, after_points, after_user_id, limit))
+        return cur.fetchall()
+
+
+def get_leaderboard_page_count(guild_id: int, page_size: int) -> int:
+    state = LEADERBOARD_CACHE.state(guild_id, page_size)
+    if state.members is None:
+        with db() as con:
+            cur = con.cursor()
+            cur.execute("SELECT COUNT(*) FROM users WHERE guild_id=?", (guild_id,))
+            (state.members,) = cur.fetchone()
+    return -(-state.members // page_size)
+
+
+def get_leaderboard_page(guild_id: int, page: int, page_size: int) -> list[tuple]:
+    """Rows for a 0-based page, walking forward from the nearest cursor we already know.
+
+    Pages past the end return nothing without walking, so a huge page number can't make
+    us read the whole ranking on the event loop.
+    """
+    if page >= get_leaderboard_page_count(guild_id, page_size):
+        return []
+    state = LEADERBOARD_CACHE.state(guild_id, page_size)
+    cursors = state.cursors
+
+    start = min(page, len(cursors) - 1)
+    rows = fetch_leaderboard_rows(guild_id, cursors[start], (page - start + 1) * page_size)
+
+    # Every full page we walked over gives us the cursor for the page after it.
+    for offset in range(page_size, len(rows) + 1, page_size):
+        index = start + offset // page_size
+        if index == len(cursors):
+            user_id, points, _ = rows[offset - 1]
+            cursors.append((points, user_id))
+
+    return rows[(page - start) * page_size:]
+
+
+async def render_leaderboard_page(guild: discord.Guild, page: int, page_size: int) -> str | None:
+    """Leaderboard text for a 0-based page, or None if the page is past the end."""
+    state = LEADERBOARD_CACHE.state(guild.id, page_size)
+    if page in state.pages:
+        return state.pages[page]
+
+    rows = get_leaderboard_page(guild.id, page, page_size)
+    if not rows:
+        return None
+
+    names = await resolve_display_names(guild, [user_id for user_id, _, _ in rows])
+    lines = []
+    for i, (user_id, points, house) in enumerate(rows, start=page * page_size + 1):
+        name = names.get(user_id, f"<@{user_id}>")
+        lines.append(f"**{i}.** {name} — **{points}** ({house or 'Unsorted'})")
+
+    text = f"📊 **Leaderboard** — page {page + 1}\n" + "\n".join(lines)
+    state.pages[page] = text
+    return text
+
+
+def get_user_rank(guild_id: int, user_id: int, points: int) -> int:
+    """1-based position of a user, counting only the index entries ranked ahead of them."""
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT COUNT(*)
+            FROM users
+            WHERE guild_id=? AND points >= ? AND (points > ? OR user_id < ?)
+        """, (guild_id, points, points, user_id))
+        (ahead,) = cur.fetchone()
+    return ahead + 1
+
+
+class LeaderboardView(discord.ui.View):
+    """Previous/next buttons for a leaderboard reply; only the invoker can page."""
+
+    def __init__(self, guild: discord.Guild, owner_id: int, page: int, page_size: int):
+        super().__init__(timeout=LEADERBOARD_VIEW_TIMEOUT)
+        self.guild = guild
+        self.owner_id = owner_id
+        self.page = page
+        self.page_size = page_size
+        self.previous_page.disabled = page == 0
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            prefix = get_guild_settings(interaction.guild_id).prefix
+            await interaction.response.send_message(f"Run `{prefix}leaderboard` to get your own copy.",
+                                                    ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        text = await render_leaderboard_page(self.guild, page, self.page_size)
+        if text is None:
+            self.next_page.disabled = True
+            await interaction.response.edit_message(view=self)
+            return
+        self.page = page
+        self.previous_page.disabled = page == 0
+        self.next_page.disabled = False
+        await interaction.response.edit_message(content=text, view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+
+# ----------------------------
+# HISTORY
+# ----------------------------
+HISTORY_PAGE_SIZE = 10
+HISTORY_CACHE_PAGES = 2_000  # rendered older pages kept across all guilds
+HISTORY_VIEW_TIMEOUT = 120  # seconds the page buttons stay active
+HISTORY_EXPORT_MAX_ROWS = 100_000  # newest rows per export (~8 MB of CSV)
+HISTORY_EXPORT_BATCH = 1_000
+
+
+class HistoryPageCache:
+    """Bounded LRU of rendered history pages keyed by (guild_id, user_id, before_id).
+
+    points_log is append-only, so the page of rows older than a given id never changes
+    and needs no invalidation. The newest page (before_id None) is never cached.
+    """
+
+    def __init__(self, max_pages: int):
+        self.max_pages = max_pages
+        self._pages: OrderedDict[tuple[int, int, int], tuple[list[str], int | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def get(self, key: tuple[int, int, int]):
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+        return page
+
+    def put(self, key: tuple[int, int, int], page: tuple[list[str], int | None]):
+        self._pages[key] = page
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+
+HISTORY_CACHE = HistoryPageCache(HISTORY_CACHE_PAGES)
+
+
+def fetch_history_rows(guild_id: int, user_id: int, before_id: int | None, limit: int,
+                       con: sqlite3.Connection | None = None) -> list[tuple]:
+    """Rows (id, created_at, delta, moderator_user_id, kind, reason, message_id, emoji_id), newest first."""
+    with con or db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT id, created_at, delta, moderator_user_id, kind, reason, message_id, emoji_id
+            FROM points_log
+            WHERE guild_id=? AND target_user_id=? AND id < ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (guild_id, user_id, before_id if before_id is not None else 2 ** 63 - 1, limit))
+        return cur.fetchall()
+
+
+def format_history_row(row: tuple) -> str:
+    _, created_at, delta, moderator_id, kind, reason, message_id, emoji_id = row
+    by = f" — <@{moderator_id}>" if kind == LOG_MANUAL else ""
+    return (f"`{created_at[:16].replace('T', ' ')}` **{delta:+d}** "
+            f"{describe_log_entry(kind, reason, message_id, emoji_id)}{by}")
+
+
+def get_history_page(guild_id: int, user_id: int, before_id: int | None) -> tuple[list[str], int | None]:
+    """Rendered lines for one page plus the cursor for the next (older) page, if any."""
+    key = (guild_id, user_id, before_id)
+    if before_id is not None:
+        page = HISTORY_CACHE.get(key)
+        if page is not None:
+            return page
+
+    rows = fetch_history_rows(guild_id, user_id, before_id, HISTORY_PAGE_SIZE + 1)
+    older = rows[HISTORY_PAGE_SIZE - 1][0] if len(rows) > HISTORY_PAGE_SIZE else None
+    page = [format_history_row(row) for row in rows[:HISTORY_PAGE_SIZE]], older
+    if before_id is not None:
+        HISTORY_CACHE.put(key, page)
+    return page
+
+
+def history_text(display_name: str, lines: list[str], page: int) -> str:
+    return f"📜 **Points history for {display_name}** — page {page + 1}\n" + "\n".join(lines)
+
+
+def export_history_csv(guild_id: int, user_id: int) -> tuple[bytes, int, datetime | None]:
+    """CSV of the newest HISTORY_EXPORT_MAX_ROWS rows, oldest first, read from the analytics
+    snapshot when there is one. Also returns the snapshot time (None if read live).
+    Blocking; run it in a thread."""
+    snapshot = analytics_db()
+    as_of = ANALYTICS_SNAPSHOT_AT if snapshot is not None else None
+    rows = []
+    before_id = None
+    try:
+        while len(rows) < HISTORY_EXPORT_MAX_ROWS:
+            batch = fetch_history_rows(guild_id, user_id, before_id,
+                                       min(HISTORY_EXPORT_BATCH, HISTORY_EXPORT_MAX_ROWS - len(rows)), snapshot)
+            if not batch:
+                break
+            rows.extend(batch)
+            before_id = batch[-1][0]
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["id", "created_at", "delta", "moderator_user_id", "reason"])
+    for log_id, created_at, delta, moderator_id, kind, reason, message_id, emoji_id in reversed(rows):
+        writer.writerow([log_id, created_at, delta, moderator_id,
+                         describe_log_entry(kind, reason, message_id, emoji_id)])
+    return buf.getvalue().encode("utf-8"), len(rows), as_of
+
+
+def can_view_history(viewer: discord.Member, user_id: int) -> bool:
+    """Members see their own log; someone else's (moderator ids, reasons) needs Manage Messages."""
+    return viewer.id == user_id or viewer.guild_permissions.manage_messages
+
+
+class HistoryView(discord.ui.View):
+    """Newer/older buttons for a history reply; only the invoker can page."""
+
+    def __init__(self, owner_id: int, guild_id: int, user_id: int, display_name: str, older: int | None):
+        super().__init__(timeout=HISTORY_VIEW_TIMEOUT)
+        self.owner_id = owner_id
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.display_name = display_name
+        self.cursors: list[int | None] = [None]  # before_id of every page up to the current one
+        self.older = older
+        self._sync_buttons()
+
+    def _sync_buttons(self):
+        self.newer_page.disabled = len(self.cursors) == 1
+        self.older_page.disabled = self.older is None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            prefix = get_guild_settings(interaction.guild_id).prefix
+            await interaction.response.send_message(f"Run `{prefix}history` to get your own copy.", ephemeral=True)
+            return False
+        if not can_view_history(interaction.user, self.user_id):
+            await interaction.response.send_message("❌ You no longer have permission to view this history.",
+                                                    ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction):
+        lines, self.older = get_history_page(self.guild_id, self.user_id, self.cursors[-1])
+        self._sync_buttons()
+        await interaction.response.edit_message(
+            content=history_text(self.display_name, lines, len(self.cursors) - 1), view=self,
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await self._show(interaction)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.older is not None:
+            self.cursors.append(self.older)
+        await self._show(interaction)
+
+
+# ----------------------------
+# TERMS (House Cup rollover)
+# ----------------------------
+TERM_SCHEDULER_INTERVAL = 60  # seconds between checks for due rollovers
+TERM_RESET_CHUNK = 500  # users archived + reset per transaction
+TERM_RESET_PAUSE = 0.05  # seconds to yield between chunks so live awards keep flowing
+
+ROLLOVERS_RUNNING: set[int] = set()
+
+
+def get_term_schedule(guild_id: int):
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT channel_id, interval_days, next_run_at FROM term_schedules WHERE guild_id=?
+        """, (guild_id,))
+        return cur.fetchone()
+
+
+def as_naive_utc(moment: datetime) -> datetime:
+    """Schedules are stored and compared as naive UTC; convert aware times instead of mixing them."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def set_term_schedule(guild_id: int, channel_id: int | None, interval_days: int, next_run_at: datetime):
+    next_run_at = as_naive_utc(next_run_at)
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            INSERT INTO term_schedules (guild_id, channel_id, interval_days, next_run_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET
+                channel_id=excluded.channel_id,
+                interval_days=excluded.interval_days,
+                next_run_at=excluded.next_run_at
+        """, (guild_id, channel_id, interval_days, next_run_at.isoformat()))
+        con.commit()
+
+
+def clear_term_schedule(guild_id: int) -> bool:
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM term_schedules WHERE guild_id=?", (guild_id,))
+        con.commit()
+        return cur.rowcount > 0
+
+
+def get_due_term_guilds() -> list[int]:
+    """Guilds whose rollover is due, plus any whose rollover was interrupted mid-way."""
+    now = datetime.utcnow().isoformat()
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT guild_id FROM term_schedules WHERE next_run_at <= ?
+            UNION
+            SELECT guild_id FROM terms WHERE status='archiving'
+        """, (now,))
+        return [guild_id for (guild_id,) in cur.fetchall()]
+
+
+def start_or_resume_term(guild_id: int) -> int:
+    """Id of the guild's in-progress rollover, creating one if none is running."""
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("SELECT id FROM terms WHERE guild_id=? AND status='archiving'", (guild_id,))
+        row = cur.fetchone()
+        if row:
+            return row[0]
+        cur.execute("""
+            INSERT INTO terms (guild_id, status, started_at) VALUES (?, 'archiving', ?)
+        """, (guild_id, datetime.utcnow().isoformat()))
+        con.commit()
+        return cur.lastrowid
+
+
+def advance_term_schedule(cur: sqlite3.Cursor, guild_id: int):
+    """Move a due schedule past now, inside the caller's transaction."""
+    cur.execute("SELECT interval_days, next_run_at FROM term_schedules WHERE guild_id=?", (guild_id,))
+    row = cur.fetchone()
+    if not row:
+        return
+    interval_days, next_run_at = row
+    next_run = as_naive_utc(datetime.fromisoformat(next_run_at))
+    now = datetime.utcnow()
+    while next_run <= now:
+        next_run += timedelta(days=interval_days)
+    cur.execute("UPDATE term_schedules SET next_run_at=? WHERE guild_id=?", (next_run.isoformat(), guild_id))
+
+
+def archive_term_chunk(term_id: int, guild_id: int) -> int:
+    """Move the next chunk of users' points into term_standings. Returns rows handled.
+
+    Each chunk snapshots and subtracts exactly the points it archived inside one
+    transaction, and the cursor is saved with it, so awards that land between chunks
+    are never lost and an interrupted rollover resumes where it stopped. The last call
+    closes the term and advances the schedule together, so a restart can't see a due
+    schedule with no term in progress and reset everyone a second time.
+    """
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT cursor_user_id FROM terms WHERE id=?", (term_id,))
+        (cursor_user_id,) = cur.fetchone()
+        cur.execute("""
+            SELECT user_id, house, points
+            FROM users
+            WHERE guild_id=? AND user_id > ?
+            ORDER BY user_id
+            LIMIT ?
+        """, (guild_id, cursor_user_id, TERM_RESET_CHUNK))
+        rows = cur.fetchall()
+        if not rows:
+            cur.execute("""
+                UPDATE terms SET status='done', ended_at=? WHERE id=?
+            """, (datetime.utcnow().isoformat(), term_id))
+            advance_term_schedule(cur, guild_id)
+            con.commit()
+            return 0
+
+        scored = [(user_id, house, points) for user_id, house, points in rows if points]
+        cur.executemany("""
+            INSERT INTO term_standings (term_id, guild_id, user_id, house, points)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(term_id, guild_id, user_id, house, points) for user_id, house, points in scored])
+        cur.executemany("""
+            UPDATE users SET points = points - ? WHERE guild_id=? AND user_id=?
+        """, [(points, guild_id, user_id) for user_id, _, points in scored])
+        cur.execute("UPDATE terms SET cursor_user_id=? WHERE id=?", (rows[-1][0], term_id))
+        con.commit()
+
+    for user_id, _, _ in scored:
+        USER_CACHE.invalidate((guild_id, user_id))
+    if scored:
+        LEADERBOARD_CACHE.invalidate(guild_id)
+    return len(rows)
+
+
+def get_term_results(term_id: int):
+    """(house totals, top students) for an archived term."""
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT house, SUM(points) AS total
+            FROM term_standings
+            WHERE term_id=? AND house IS NOT NULL
+            GROUP BY house
+            ORDER BY total DESC
+        """, (term_id,))
+        houses = cur.fetchall()
+        cur.execute("""
+            SELECT user_id, house, points
+            FROM term_standings
+            WHERE term_id=?
+            ORDER BY points DESC, user_id
+            LIMIT 3
+        """, (term_id,))
+        return houses, cur.fetchall()
+
+
+def format_term_results(term_id: int) -> str:
+    houses, top = get_term_results(term_id)
+    if not houses and not top:
+        return f"🏁 **Term {term_id} closed** — nobody scored any points."
+    lines = [f"🏁 **Term {term_id} closed — final House Cup standings**"]
+    lines += [f"**{i}. {house}** — **{total}**" for i, (house, total) in enumerate(houses, start=1)]
+    if top:
+        lines.append("🌟 Top students: " + ", ".join(f"<@{user_id}> (**{points}**)" for user_id, _, points in top))
+    return "\n".join(lines)
+
+
+async def run_term_rollover(guild_id: int, announce: bool = True) -> int | None:
+    """Archive standings and reset points for a guild, then post the results."""
+    if guild_id in ROLLOVERS_RUNNING:
+        return None
+    ROLLOVERS_RUNNING.add(guild_id)
+    try:
+        term_id = start_or_resume_term(guild_id)
+        while archive_term_chunk(term_id, guild_id):
+            await asyncio.sleep(TERM_RESET_PAUSE)
+
+        schedule = get_term_schedule(guild_id)
+        guild = bot.get_guild(guild_id)
+        if announce and schedule and schedule[0] and guild is not None:
+            channel = guild.get_channel(schedule[0])
+            if channel is not None:
+                try:
+                    await channel.send(format_term_results(term_id))
+                except (discord.Forbidden, discord.HTTPException):
+                    pass
+        return term_id
+    finally:
+        ROLLOVERS_RUNNING.discard(guild_id)
+
+
+@tasks.loop(seconds=TERM_SCHEDULER_INTERVAL)
+async def term_scheduler():
+    for guild_id in get_due_term_guilds():
+        try:
+            await run_term_rollover(guild_id)
+        except Exception as e:  # one guild's failure must not stop the loop for everyone
+            print(f"Term rollover failed for guild {guild_id}: {e!r}")
+
+
+# ----------------------------
+# BACKUPS
+# ----------------------------
+BACKUP_DIR = "backups"
+BACKUP_INTERVAL_HOURS = 6
+BACKUP_RETENTION = 8  # compressed snapshots kept
+BACKUP_PAGES_PER_STEP = 256  # pages copied per backup step; the source is unlocked between steps
+BACKUP_STEP_PAUSE = 0.005  # seconds between steps
+BACKUP_MAX_RESTARTS = 5  # after this many restarts from concurrent writes, copy in one step
+
+BACKUP_PREFIX = "sorting_hat-"
+BACKUP_SUFFIX = ".sqlite3.gz"
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def _copy_database(dest_path: str, verify: bool = False):
+    """Online copy of DB_FILE using SQLite's backup API in small steps.
+
+    A write from another connection makes SQLite restart the copy. If that happens too
+    often, fall back to a single step; in WAL mode that is one read transaction and
+    still doesn't block writers. `verify` runs a full integrity check on the copy; only
+    backups need it, since a bad analytics snapshot is simply replaced at the next refresh.
+    """
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted()
+        last_remaining = remaining
+
+    src = sqlite3.connect(DB_FILE)
+    dst = sqlite3.connect(dest_path)
+    try:
+        try:
+            src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=progress, sleep=BACKUP_STEP_PAUSE)
+        except _BackupRestarted:
+            src.backup(dst, pages=-1)
+        if verify:
+            (result,) = dst.execute("PRAGMA integrity_check").fetchone()
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"Backup failed integrity check: {result}")
+    finally:
+        dst.close()
+        src.close()
+
+
+def list_backups() -> list[str]:
+    """Snapshot paths, oldest first (names sort by timestamp)."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    names = sorted(n for n in os.listdir(BACKUP_DIR) if n.startswith(BACKUP_PREFIX) and n.endswith(BACKUP_SUFFIX))
+    return [os.path.join(BACKUP_DIR, n) for n in names]
+
+
+def create_backup() -> str:
+    """Write a verified, gzip-compressed snapshot and prune old ones. Blocking; run it in a thread."""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    final_path = os.path.join(BACKUP_DIR, f"{BACKUP_PREFIX}{stamp}{BACKUP_SUFFIX}")
+    raw_path = final_path + ".raw"
+    try:
+        _copy_database(raw_path, verify=True)
+        with open(raw_path, "rb") as src, gzip.open(final_path + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(final_path + ".tmp", final_path)
+    finally:
+        for leftover in (raw_path, final_path + ".tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    for old in list_backups()[:-BACKUP_RETENTION]:
+        os.remove(old)
+    return final_path
+
+
+@tasks.loop(hours=BACKUP_INTERVAL_HOURS)
+async def backup_task():
+    try:
+        path = await asyncio.to_thread(create_backup)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Backup failed: {e}")
+        return
+    print(f"Backup written: {path}")
+
+
+# ----------------------------
+# ANALYTICS SNAPSHOT
+# ----------------------------
+ANALYTICS_DB_FILE = "analytics.sqlite3"
+ANALYTICS_REFRESH_MINUTES = 15
+ANALYTICS_MAX_AGE = timedelta(hours=1)  # older snapshots (refresh failing) are ignored in favour of live reads
+
+# Aggregates computed into every snapshot so reporting commands read a handful of rows.
+_ANALYTICS_AGGREGATES = [
+    """
+    CREATE TABLE analytics_house_totals AS
+    SELECT guild_id, house, COUNT(*) AS members, SUM(points) AS points
+    FROM users WHERE house IS NOT NULL
+    GROUP BY guild_id, house
+    """,
+    """
+    CREATE TABLE analytics_log_kinds AS
+    SELECT guild_id, kind, COUNT(*) AS entries, SUM(delta) AS net
+    FROM points_log
+    GROUP BY guild_id, kind
+    """,
+    """
+    CREATE TABLE analytics_moderators AS
+    SELECT guild_id, moderator_user_id, COUNT(*) AS entries, SUM(delta) AS net
+    FROM points_log WHERE kind = 0
+    GROUP BY guild_id, moderator_user_id
+    """,
+    "CREATE INDEX analytics_house_totals_guild ON analytics_house_totals (guild_id)",
+    "CREATE INDEX analytics_log_kinds_guild ON analytics_log_kinds (guild_id)",
+    "CREATE INDEX analytics_moderators_guild ON analytics_moderators (guild_id, entries DESC)",
+]
+
+ANALYTICS_SNAPSHOT_AT: datetime | None = None  # when the current snapshot was copied
+
+
+def refresh_analytics() -> datetime:
+    """Copy the live DB, precompute aggregates into the copy and swap it in. Blocking; run it in a thread.
+
+    The copy goes through the same stepped backup API as BACKUPS, so writers are never
+    held up; everything after that touches only the copy.
+    """
+    global ANALYTICS_SNAPSHOT_AT
+    tmp_path = ANALYTICS_DB_FILE + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    taken_at = datetime.utcnow()
+    try:
+        _copy_database(tmp_path)
+        con = sqlite3.connect(tmp_path)
+        try:
+            con.execute("PRAGMA journal_mode=DELETE")  # opened read-only later; no -wal/-shm needed
+            for sql in _ANALYTICS_AGGREGATES:
+                con.execute(sql)
+            con.execute("INSERT OR REPLACE INTO bot_meta (key, value) VALUES ('snapshot_at', ?)",
+                        (taken_at.isoformat(),))
+            con.commit()
+        finally:
+            con.close()
+        os.replace(tmp_path, ANALYTICS_DB_FILE)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    ANALYTICS_SNAPSHOT_AT = taken_at
+    return taken_at
+
+
+def analytics_db() -> sqlite3.Connection | None:
+    """Read-only connection to a fresh-enough snapshot, or None to read the live DB instead."""
+    if ANALYTICS_SNAPSHOT_AT is None or datetime.utcnow() - ANALYTICS_SNAPSHOT_AT > ANALYTICS_MAX_AGE:
+        return None
+    try:
+        return sqlite3.connect(f"file:{os.path.abspath(ANALYTICS_DB_FILE)}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+
+
+def staleness_note(as_of: datetime | None) -> str:
+    if as_of is None:
+        return "\n-# live figures"
+    minutes = int((datetime.utcnow() - as_of).total_seconds() // 60)
+    return f"\n-# figures as of {minutes} min ago (refreshed every {ANALYTICS_REFRESH_MINUTES} min)"
+
+
+def get_house_cup(guild_id: int) -> tuple[list[tuple], datetime | None]:
+    """(house, total) rows, best first, plus the snapshot time (None if read live)."""
+    con = analytics_db()
+    if con is not None:
+        try:
+            rows = con.execute("""
+                SELECT house, points FROM analytics_house_totals WHERE guild_id=? ORDER BY points DESC
+            """, (guild_id,)).fetchall()
+            return rows, ANALYTICS_SNAPSHOT_AT
+        finally:
+            con.close()
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT house, COALESCE(SUM(points), 0) as total
+            FROM users
+            WHERE guild_id=? AND house IS NOT NULL
+            GROUP BY house
+            ORDER BY total DESC
+        """, (guild_id,))
+        return cur.fetchall(), None
+
+
+def get_audit(guild_id: int) -> tuple[list[tuple], list[tuple], datetime | None] | None:
+    """(entries/net per log kind, top manual moderators, snapshot time), or None without a snapshot."""
+    con = analytics_db()
+    if con is None:
+        return None
+    try:
+        kinds = con.execute("""
+            SELECT kind, entries, net FROM analytics_log_kinds WHERE guild_id=? ORDER BY kind
+        """, (guild_id,)).fetchall()
+        moderators = con.execute("""
+            SELECT moderator_user_id, entries, net FROM analytics_moderators
+            WHERE guild_id=? ORDER BY entries DESC LIMIT 5
+        """, (guild_id,)).fetchall()
+        return kinds, moderators, ANALYTICS_SNAPSHOT_AT
+    finally:
+        con.close()
+
+
+@tasks.loop(minutes=ANALYTICS_REFRESH_MINUTES)
+async def analytics_task():
+    try:
+        await asyncio.to_thread(refresh_analytics)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Analytics snapshot failed: {e}")
+
+
+# ----------------------------
+# REACTION TRACING
+# ----------------------------
+TRACE_SAMPLE_RATE = 0.0  # fraction of reaction events traced; 0 turns tracing off
+TRACE_FILE = "traces/reactions.jsonl"
+TRACE_MAX_BYTES = 10 * 1024 * 1024  # rotate the JSONL file at this size
+TRACE_BACKUP_COUNT = 5  # rotated files kept (reactions.jsonl.1 … .5)
+TRACE_BUFFER_SIZE = 10_000  # records held in memory; the oldest are dropped if the writer falls behind
+TRACE_FLUSH_INTERVAL = 2  # seconds between writes to disk
+
+
+class ReactionTrace:
+    """Outcome and per-stage timings (ms since the previous stage) for one reaction event."""
+
+    __slots__ = ("event", "payload", "started", "last", "stages")
+
+    def __init__(self, event: str, payload: discord.RawReactionActionEvent):
+        self.event = event
+        self.payload = payload
+        self.started = self.last = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def stage(self, name: str):
+        now = time.perf_counter()
+        self.stages[name] = round((now - self.last) * 1000, 3)
+        self.last = now
+
+    def to_record(self, outcome: str) -> dict:
+        payload = self.payload
+        return {
+            "ts": datetime.utcnow().isoformat(),
+            "event": self.event,
+            "outcome": outcome,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "stages": self.stages,
+            "guild_id": payload.guild_id,
+            "channel_id": payload.channel_id,
+            "message_id": payload.message_id,
+            "user_id": payload.user_id,
+            "emoji": str(payload.emoji),
+        }
+
+
+class _UnsampledTrace:
+    """Stand-in for events that weren't sampled, so handlers can call stage() unconditionally."""
+
+    __slots__ = ()
+
+    def stage(self, name: str):
+        pass
+
+
+UNSAMPLED_TRACE = _UnsampledTrace()
+TRACE_BUFFER: deque[dict] = deque(maxlen=TRACE_BUFFER_SIZE)
+TRACE_STATS = Counter()  # "buffered", "overflowed", "written", "write_errors"
+_trace_logger: logging.Logger | None = None
+
+
+def start_reaction_trace(event: str, payload: discord.RawReactionActionEvent):
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return UNSAMPLED_TRACE
+    return ReactionTrace(event, payload)
+
+
+def finish_reaction_trace(trace, outcome: str):
+    """Queue a finished trace; never blocks the event loop on disk I/O."""
+    if trace is UNSAMPLED_TRACE:
+        return
+    if len(TRACE_BUFFER) == TRACE_BUFFER.maxlen:
+        TRACE_STATS["overflowed"] += 1
+    TRACE_BUFFER.append(trace.to_record(outcome))
+    TRACE_STATS["buffered"] += 1
+
+
+def _write_traces(records: list[dict]):
+    global _trace_logger
+    if _trace_logger is None:
+        os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT, encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _trace_logger = logging.getLogger("sorting_hat.trace")
+        _trace_logger.propagate = False
+        _trace_logger.setLevel(logging.INFO)
+        _trace_logger.addHandler(handler)
+    for record in records:
+        _trace_logger.info(json.dumps(record, ensure_ascii=False))
+
+
+@tasks.loop(seconds=TRACE_FLUSH_INTERVAL)
+async def trace_writer():
+    if not TRACE_BUFFER:
+        return
+    records = [TRACE_BUFFER.popleft() for _ in range(len(TRACE_BUFFER))]
+    try:
+        await asyncio.to_thread(_write_traces, records)
+    except OSError as e:
+        TRACE_STATS["write_errors"] += 1
+        print(f"Trace write failed: {e}")
+        return
+    TRACE_STATS["written"] += len(records)
+
+
+# ----------------------------
+# LIFECYCLE
+# ----------------------------
+SHUTDOWN_DRAIN_TIMEOUT = 20  # seconds to wait for in-flight handlers; Heroku kills at 30s after SIGTERM
+
+PROCESS_STARTED = time.monotonic()
+
+
+class ShuttingDown(commands.CheckFailure):
+    pass
+
+
+class Lifecycle:
+    """Tracks in-flight work so a SIGTERM can stop intake, drain and close cleanly."""
+
+    def __init__(self):
+        self.accepting = True
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.ready_seconds: float | None = None  # process start -> first on_ready
+        self.downtime_seconds: float | None = None  # previous shutdown -> first on_ready
+        self._shutdown_task: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def track(self):
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.set()
+
+    def begin(self):
+        self.in_flight += 1
+        self._idle.clear()
+
+    def end(self):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    def request_shutdown(self, reason: str):
+        if self._shutdown_task is None:
+            self._shutdown_task = asyncio.create_task(self.shutdown(reason))
+
+    async def shutdown(self, reason: str):
+        print(f"Shutting down ({reason}): draining {self.in_flight} in-flight handler(s)")
+        self.accepting = False
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=SHUTDOWN_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Drain deadline hit with {self.in_flight} handler(s) still running")
+
+        # Rollovers resume from their saved cursor and backups are redone next interval,
+        # so cancelling them mid-way loses nothing.
+        for loop_task in (term_scheduler, backup_task, trace_writer, memory_reporter, analytics_task):
+            loop_task.cancel()
+
+        if TRACE_BUFFER:
+            _write_traces([TRACE_BUFFER.popleft() for _ in range(len(TRACE_BUFFER))])
+        flush_database()
+        print(f"Drained in {time.monotonic() - started:.2f}s; closing gateway connection")
+        await bot.close()
+
+
+LIFECYCLE = Lifecycle()
+
+
+def get_meta(key: str) -> str | None:
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("SELECT value FROM bot_meta WHERE key=?", (key,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+
+def set_meta(key: str, value: str):
+    with db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            INSERT INTO bot_meta (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value=excluded.value
+        """, (key, value))
+        con.commit()
+
+
+def flush_database():
+    """Fold the WAL back into the main file and note when we stopped."""
+    set_meta("last_shutdown_at", datetime.utcnow().isoformat())
+    with db() as con:
+        con.execute("PRAGMA optimize")
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def record_ready():
+    """Measure restart-to-ready on the first on_ready of this process."""
+    if LIFECYCLE.ready_seconds is not None:
+        return
+    LIFECYCLE.ready_seconds = time.monotonic() - PROCESS_STARTED
+    last_shutdown = get_meta("last_shutdown_at")
+    if last_shutdown:
+        LIFECYCLE.downtime_seconds = (datetime.utcnow() - datetime.fromisoformat(last_shutdown)).total_seconds()
+    set_meta("last_ready_seconds", f"{LIFECYCLE.ready_seconds:.3f}")
+    downtime = f", {LIFECYCLE.downtime_seconds:.1f}s since last shutdown" if LIFECYCLE.downtime_seconds else ""
+    print(f"Ready in {LIFECYCLE.ready_seconds:.2f}s after process start{downtime}")
+
+
+@bot.check
+async def accepting_commands(ctx: commands.Context) -> bool:
+    if not LIFECYCLE.accepting:
+        raise ShuttingDown()
+    return True
+
+
+@bot.before_invoke
+async def before_any_command(ctx: commands.Context):
+    LIFECYCLE.begin()
+
+
+@bot.after_invoke
+async def after_any_command(ctx: commands.Context):
+    LIFECYCLE.end()
+
+
+# ----------------------------
+# MEMORY PROFILE
+# ----------------------------
+MEMORY_PROFILE_INTERVAL = 0  # minutes between memory reports printed to the log; 0 = only !memprofile
+
+_SIZED_CONTAINERS = (dict, list, tuple, set, frozenset, deque)
+
+
+def rss_bytes() -> int | None:
+    """Current resident set size, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def deep_sizeof(obj, seen: set[int] | None = None) -> int:
+    """Bytes held by our own structures: containers and this module's objects, recursively.
+
+    discord.py objects are counted shallowly; their internals belong to its caches.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, _SIZED_CONTAINERS):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif type(obj).__module__ == __name__:
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                size += deep_sizeof(getattr(obj, slot), seen)
+        if hasattr(obj, "__dict__"):
+            size += deep_sizeof(obj.__dict__, seen)
+    return size
+
+
+def memory_report() -> str:
+    ours = [
+        ("User records", len(USER_CACHE), USER_CACHE._entries),
+        ("Leaderboard pages", len(LEADERBOARD_CACHE._guilds), LEADERBOARD_CACHE._guilds),
+        ("History pages", len(HISTORY_CACHE), HISTORY_CACHE._pages),
+        ("Guild settings", len(GUILD_SETTINGS), GUILD_SETTINGS),
+        ("Quiz banks", len(QUIZ_BANKS), QUIZ_BANKS),
+        ("House counts", len(HOUSE_COUNTS._guilds), HOUSE_COUNTS._guilds),
+        ("Emoji ids", len(EMOJI_IDS), (EMOJI_IDS, EMOJI_NAMES)),
+        ("Op key filter", OP_KEYS.bloom.count if OP_KEYS.bloom else 0, OP_KEYS.bloom),
+        ("Channel fetches", len(CHANNEL_FETCHES), CHANNEL_FETCHES._cache),
+        ("Message fetches", len(MESSAGE_FETCHES), MESSAGE_FETCHES._cache),
+        ("Trace buffer", len(TRACE_BUFFER), TRACE_BUFFER),
+    ]
+    guilds = bot.guilds
+    view_store = bot._connection._view_store
+    theirs = [
+        ("Guilds", len(guilds)),
+        ("Members", sum(len(g.members) for g in guilds)),
+        ("Users", len(bot.users)),
+        ("Channels", sum(len(g.channels) for g in guilds)),
+        ("Threads", sum(len(g.threads) for g in guilds)),
+        ("Roles", sum(len(g.roles) for g in guilds)),
+        ("Emojis", len(bot.emojis)),
+        ("Messages", len(bot.cached_messages)),
+        ("View items", sum(len(items) for items in view_store._views.values())),
+        ("Message views", len(view_store._synced_message_views)),
+    ]
+
+    rss = rss_bytes()
+    lines = [f"RSS {rss / 2**20:.1f} MiB" if rss is not None else "RSS n/a",
+             f"asyncio tasks {len(asyncio.all_tasks())} | in-flight handlers {LIFECYCLE.in_flight} | "
+             "quizzes hold no state (it lives in the buttons)",
+             "Sorting Hat structures:"]
+    total = 0
+    for name, count, obj in ours:
+        size = deep_sizeof(obj)
+        total += size
+        lines.append(f"  {name:<18} {count:>9,} items {size / 1024:>10,.1f} KiB")
+    lines.append(f"  {'total':<18} {'':>15} {total / 1024:>10,.1f} KiB")
+    lines.append(f"discord.py caches (member cache: {'full' if FULL_MEMBER_CACHE else 'partial'}, "
+                 f"max_messages {MAX_MESSAGES}):")
+    lines += [f"  {name:<18} {count:>9,}" for name, count in theirs]
+    return "\n".join(lines)
+
+
+@tasks.loop(minutes=max(MEMORY_PROFILE_INTERVAL, 1))
+async def memory_reporter():
+    print(memory_report())
+
+
+# ----------------------------
+# EVENTS
+# ----------------------------
+APP_COMMANDS_SYNCED = False
+
+
+@bot.event
+async def on_ready():
+    if not term_scheduler.is_running():
+        term_scheduler.start()
+    if not backup_task.is_running():
+        backup_task.start()
+    if TRACE_SAMPLE_RATE > 0 and not trace_writer.is_running():
+        trace_writer.start()
+    if MEMORY_PROFILE_INTERVAL > 0 and not memory_reporter.is_running():
+        memory_reporter.start()
+    if not analytics_task.is_running():
+        analytics_task.start()
+    global APP_COMMANDS_SYNCED
+    if not APP_COMMANDS_SYNCED:
+        await bot.tree.sync()
+        APP_COMMANDS_SYNCED = True
+    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
+    record_ready()
+
+
+@bot.event
+async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
+    trace = start_reaction_trace("add", payload)
+    async with LIFECYCLE.track():
+        finish_reaction_trace(trace, await _handle_reaction_add(payload, trace))
+
+
+async def _handle_reaction_add(payload: discord.RawReactionActionEvent, trace: "ReactionTrace") -> str:
+    """Apply a reaction award. Returns the outcome code recorded in the trace."""
+    if payload.guild_id is None:
+        return "no_guild_id"
+    if payload.user_id == bot.user.id:
+        return "bot_reactor"
+
+    settings = get_guild_settings(payload.guild_id)
+    if settings.reaction_channel_ids and payload.channel_id not in settings.reaction_channel_ids:
+        return "channel_filtered"
+
+    emoji = _emoji_key(payload.emoji)
+    if emoji not in settings.reaction_points:
+        return "unknown_emoji"
+    trace.stage("filter")
+
+    guild = bot.get_guild(payload.guild_id)
+    if guild is None:
+        return "guild_missing"
+
+    try:
+        channel = await resolve_channel(guild, payload.channel_id)
+    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+        trace.stage("fetch_channel")
+        return "channel_fetch_failed"
+    trace.stage("fetch_channel")
+
+    try:
+        message = await resolve_message(channel, payload.message_id)
+    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+        trace.stage("fetch_message")
+        return "message_fetch_failed"
+    trace.stage("fetch_message")
+
+    if message.author.bot:
+        return "bot_author"
+    if message.author.id == payload.user_id:
+        return "self_react"
+
+    delta = settings.reaction_points[emoji]
+
+    recorded = record_reaction_award(payload.guild_id, payload.message_id, payload.user_id, message.author.id,
+                                     emoji, delta)
+    trace.stage("record_award")
+    return "awarded" if recorded else "duplicate_award"
+
+
+@bot.event
+async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
+    trace = start_reaction_trace("remove", payload)
+    async with LIFECYCLE.track():
+        finish_reaction_trace(trace, await _handle_reaction_remove(payload, trace))
+
+
+async def _handle_reaction_remove(payload: discord.RawReactionActionEvent, trace: "ReactionTrace") -> str:
+    """Take back a reaction award. Returns the outcome code recorded in the trace."""
+    if payload.guild_id is None:
+        return "no_guild_id"
+    if payload.user_id == bot.user.id:
+        return "bot_reactor"
+
+    # No emoji/channel filter here: an award made under older settings must still be reversible.
+    # Emojis that were never awarded are turned away in memory by find_emoji_id, with no DB hit.
+    emoji = _emoji_key(payload.emoji)
+    removed = remove_reaction_award(payload.guild_id, payload.message_id, payload.user_id, emoji)
+    trace.stage("remove_award")
+    if removed is None:
+        return "no_award"
+    previous_delta, author_id = removed
+    if author_id is not None:
+        return "reversed"
+
+    # Legacy award without a stored author: the message tells us who was credited.
+
+    guild = bot.get_guild(payload.guild_id)
+    if guild is None:
+        return "guild_missing"
+
+    try:
+        channel = await resolve_channel(guild, payload.channel_id)
+    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+        trace.stage("fetch_channel")
+        return "channel_fetch_failed"
+    trace.stage("fetch_channel")
+
+    try:
+        message = await resolve_message(channel, payload.message_id)
+    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+        trace.stage("fetch_message")
+        return "message_fetch_failed"
+    trace.stage("fetch_message")
+
+    if message.author.bot:
+        return "bot_author"
+    if message.author.id == payload.user_id:
+        return "self_react"
+
+    add_points(payload.guild_id, message.author.id, payload.user_id, -previous_delta, None,
+               LOG_REACTION_REMOVED, payload.message_id, emoji)
+    trace.stage("add_points")
+    return "reversed"
+
+
+@bot.event
+async def on_raw_reaction_clear(payload: discord.RawReactionClearEvent):
+    if payload.guild_id is None:
+        return
+
+    fallback_authors = await _legacy_award_authors(payload.guild_id, payload.channel_id, payload.message_id)
+    reverse_reaction_awards(payload.guild_id, [payload.message_id], fallback_authors=fallback_authors)
+
+
+@bot.event
+async def on_raw_reaction_clear_emoji(payload: discord.RawReactionClearEmojiEvent):
+    if payload.guild_id is None:
+        return
+
+    emoji = _emoji_key(payload.emoji)
+    if find_emoji_id(emoji) is None:
+        return
+
+    fallback_authors = await _legacy_award_authors(payload.guild_id, payload.channel_id, payload.message_id)
+    reverse_reaction_awards(payload.guild_id, [payload.message_id], emoji=emoji,
+                            fallback_authors=fallback_authors)
+
+
+@bot.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    if payload.guild_id is None:
+        return
+
+    fallback_authors = {}
+    if payload.cached_message is not None:
+        fallback_authors[payload.message_id] = payload.cached_message.author.id
+    reverse_reaction_awards(payload.guild_id, [payload.message_id], fallback_authors=fallback_authors)
+
+
+@bot.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    if payload.guild_id is None:
+        return
+
+    fallback_authors = {m.id: m.author.id for m in payload.cached_messages}
+    reverse_reaction_awards(payload.guild_id, list(payload.message_ids), fallback_authors=fallback_authors)
+
+
+# ----------------------------
+# COMMANDS
+# ----------------------------
+@bot.tree.command(name="sort", description="Put on the Sorting Hat and find your house.")
+@app_commands.guild_only()
+async def sort_slash(interaction: discord.Interaction):
+    if not LIFECYCLE.accepting:
+        await interaction.response.send_message("🔁 The Sorting Hat is restarting — try again in a few seconds.",
+                                                ephemeral=True)
+        return
+    async with LIFECYCLE.track():
+        await start_sorting_quiz(interaction, "s")
+
+
+@bot.command(name="sort")
+async def sort_me(ctx: commands.Context):
+    record = get_user_record(ctx.guild.id, ctx.author.id)
+    if record and record[0] in get_quiz_bank(ctx.guild.id).houses:
+        await ctx.reply(f"🪄 You’re already sorted into **{record[0]}**! "
+                        f"Use `{ctx.clean_prefix}resort` if you allow re-sorting.")
+        return
+
+    await ctx.reply("🪄 **Sorting Hat Test** — press the button to begin (or use `/sort`).",
+                    view=quiz_start_view("s"))
+
+
+@bot.command(name="resort")
+@commands.has_permissions(manage_guild=True)
+async def resort(ctx: commands.Context, member: discord.Member | None = None):
+    """(Admin) Re-sort yourself or a mentioned member; they answer the quiz via buttons."""
+    member = member or ctx.author
+    await ctx.reply(f"🔁 {member.mention}, the Sorting Hat will look at you again — press the button to begin.",
+                    view=quiz_start_view("r", member.id))
+
+
+@bot.group(name="quizbank", invoke_without_command=True)
+@commands.has_permissions(manage_guild=True)
+async def quiz_bank_group(ctx: commands.Context):
+    """(Admin) Show the guild's quiz bank. Subcommands: upload, reset."""
+    bank = get_quiz_bank(ctx.guild.id)
+    source = "custom" if get_guild_quiz_bank_data(ctx.guild.id) else "default"
+    asked = bank.subset_size or len(bank.questions)
+    await ctx.reply(
+        f"📚 **Quiz bank** ({source}, version `{bank.version}`): {len(bank.questions)} questions, "
+        f"{asked} asked per quiz, houses: {', '.join(bank.houses)}\n"
+        f"Use `{ctx.clean_prefix}quizbank upload` with a .json attachment, "
+        f"or `{ctx.clean_prefix}quizbank reset` for the default."
+    )
+
+
+@quiz_bank_group.command(name="upload")
+@commands.has_permissions(manage_guild=True)
+async def quiz_bank_upload(ctx: commands.Context):
+    if not ctx.message.attachments:
+        await ctx.reply("❌ Attach the quiz bank as a .json file.")
+        return
+    try:
+        data = json.loads(await ctx.message.attachments[0].read())
+        bank = QuizBank(data)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        await ctx.reply(f"❌ That quiz bank doesn’t load: {e}")
+        return
+    save_guild_quiz_bank(ctx.guild.id, data)
+    await ctx.reply(f"📚 Quiz bank saved (version `{bank.version}`, {len(bank.questions)} questions).")
+
+
+@quiz_bank_group.command(name="reset")
+@commands.has_permissions(manage_guild=True)
+async def quiz_bank_reset(ctx: commands.Context):
+    save_guild_quiz_bank(ctx.guild.id, None)
+    await ctx.reply("📚 Back to the default quiz bank.")
+
+
+@bot.group(name="points", invoke_without_command=True)
+async def points_group(ctx: commands.Context):
+    await ctx.reply(f"Use `{ctx.clean_prefix}points add @user 10 reason` "
+                    f"or `{ctx.clean_prefix}points remove @user 5 reason`. "
+                    "Several @users, @roles or house names work too.")
+
+
+BULK_POINTS_MAX_TARGETS = 10_000
+
+
+class HouseName(commands.Converter):
+    """A house of the guild's quiz bank, matched case-insensitively."""
+
+    async def convert(self, ctx: commands.Context, argument: str) -> str:
+        for house in get_quiz_bank(ctx.guild.id).houses:
+            if house.lower() == argument.lower():
+                return house
+        raise commands.BadArgument(f"{argument} is not a house")
+
+
+PointTargets = commands.Greedy[HouseName | discord.Member | discord.Role]
+
+
+async def apply_points_command(ctx: commands.Context, targets: list, delta: int, reason: str | None):
+    """Shared body of !points add/remove: one member, or any mix of members, roles and houses."""
+    if not targets:
+        raise commands.MissingRequiredArgument(ctx.command.clean_params["targets"])
+
+    if len(targets) == 1 and isinstance(targets[0], discord.Member):
+        member = targets[0]
+        if not add_points(ctx.guild.id, member.id, ctx.author.id, delta, reason, op_key=ctx.message.id):
+            return  # this message was already applied (gateway replay); the first run replied
+        label = f"**{member.display_name}**"
+    else:
+        user_ids: set[int] = set()
+        houses = [t for t in targets if isinstance(t, str)]
+        if houses:
+            user_ids.update(get_house_member_ids(ctx.guild.id, houses))
+        for target in targets:
+            if isinstance(target, discord.Member):
+                if not target.bot:
+                    user_ids.add(target.id)
+            elif isinstance(target, discord.Role):
+                if not FULL_MEMBER_CACHE:
+                    await ctx.reply("❌ Role targets need the full member cache, which this bot runs without. "
+                                    "Use house names or mentions instead.")
+                    return
+                user_ids.update(m.id for m in target.members if not m.bot)
+        if not user_ids:
+            await ctx.reply("❌ Nobody matched those targets.")
+            return
+        if len(user_ids) > BULK_POINTS_MAX_TARGETS:
+            await ctx.reply(f"❌ That's {len(user_ids):,} members; "
+                            f"the limit is {BULK_POINTS_MAX_TARGETS:,} per command.")
+            return
+        if not add_points_bulk(ctx.guild.id, sorted(user_ids), ctx.author.id, delta, reason, op_key=ctx.message.id):
+            return
+        names = [t if isinstance(t, str) else t.mention if isinstance(t, discord.Role) else t.display_name
+                 for t in targets]
+        label = f"**{len(user_ids)}** members ({', '.join(names)})"
+
+    if delta > 0:
+        await ctx.reply(f"🏆 Added **{delta}** points to {label}. ({reason or 'no reason'})",
+                        allowed_mentions=discord.AllowedMentions.none())
+    else:
+        await ctx.reply(f"🧨 Removed **{-delta}** points from {label}. ({reason or 'no reason'})",
+                        allowed_mentions=discord.AllowedMentions.none())
+
+
+@points_group.command(name="add")
+@commands.has_permissions(manage_messages=True)
+async def points_add(ctx: commands.Context, targets: PointTargets, amount: int, *, reason: str = None):
+    """Targets: one or more @members, @roles or house names."""
+    if amount <= 0:
+        await ctx.reply("Amount must be positive.")
+        return
+    await apply_points_command(ctx, targets, amount, reason)
+
+
+@points_group.command(name="remove")
+@commands.has_permissions(manage_messages=True)
+async def points_remove(ctx: commands.Context, targets: PointTargets, amount: int, *, reason: str = None):
+    """Targets: one or more @members, @roles or house names."""
+    if amount <= 0:
+        await ctx.reply("Amount must be positive.")
+        return
+    await apply_points_command(ctx, targets, -amount, reason)
+
+
+@bot.command(name="house")
+async def my_house(ctx: commands.Context, member: discord.Member | None = None):
+    member = member or ctx.author
+    record = get_user_record(ctx.guild.id, member.id)
+    if not record or not record[0]:
+        await ctx.reply(f"❓ **{member.display_name}** isn’t sorted yet. Use `{ctx.clean_prefix}sort`.")
+        return
+    house, points, sorted_at = record
+    await ctx.reply(f"🏰 **{member.display_name}** → **{house}** | **{points}** points")
+
+
+@bot.command(name="pointscheck")
+async def points_check(ctx: commands.Context, member: discord.Member | None = None):
+    member = member or ctx.author
+    record = get_user_record(ctx.guild.id, member.id)
+    if not record:
+        await ctx.reply(f"❓ No record for **{member.display_name}** yet.")
+        return
+    house, points, _ = record
+    await ctx.reply(f"🔎 **{member.display_name}** has **{points}** points. ({house or 'Unsorted'})")
+
+
+async def send_leaderboard_page(ctx: commands.Context, page: int, page_size: int):
+    text = await render_leaderboard_page(ctx.guild, page, page_size)
+    if text is None:
+        pages = get_leaderboard_page_count(ctx.guild.id, page_size)
+        await ctx.reply("No points yet." if pages == 0 else f"There {'is' if pages == 1 else 'are'} only "
+                        f"**{pages}** page{'' if pages == 1 else 's'}.")
+        return
+    await ctx.reply(text, view=LeaderboardView(ctx.guild, ctx.author.id, page, page_size))
+
+
+@bot.group(name="leaderboard", invoke_without_command=True)
+async def leaderboard(ctx: commands.Context, limit: int = LEADERBOARD_PAGE_SIZE):
+    limit = max(1, min(limit, LEADERBOARD_MAX_PAGE_SIZE))
+    await send_leaderboard_page(ctx, 0, limit)
+
+
+@leaderboard.command(name="page")
+async def leaderboard_page(ctx: commands.Context, page: int):
+    if page < 1:
+        await ctx.reply("Pages start at 1.")
+        return
+    await send_leaderboard_page(ctx, page - 1, LEADERBOARD_PAGE_SIZE)
+
+
+@bot.command(name="rank")
+async def rank(ctx: commands.Context, member: discord.Member | None = None):
+    member = member or ctx.author
+    record = get_user_record(ctx.guild.id, member.id)
+    if not record:
+        await ctx.reply(f"❓ No record for **{member.display_name}** yet.")
+        return
+    _, points, _ = record
+    position = get_user_rank(ctx.guild.id, member.id, points)
+    await ctx.reply(f"🥇 **{member.display_name}** is **#{position}** with **{points}** points.")
+
+
+@bot.group(name="history", invoke_without_command=True)
+async def history(ctx: commands.Context, member: discord.Member | None = None):
+    """Why did my points change? Newest entries first. Viewing someone else's needs Manage Messages."""
+    member = member or ctx.author
+    if not can_view_history(ctx.author, member.id):
+        raise commands.MissingPermissions(["manage_messages"])
+    lines, older = get_history_page(ctx.guild.id, member.id, None)
+    if not lines:
+        await ctx.reply(f"❓ No points history for **{member.display_name}** yet.")
+        return
+    await ctx.reply(history_text(member.display_name, lines, 0),
+                    view=HistoryView(ctx.author.id, ctx.guild.id, member.id, member.display_name, older),
+                    allowed_mentions=discord.AllowedMentions.none())
+
+
+@history.command(name="export")
+async def history_export(ctx: commands.Context, member: discord.Member | None = None):
+    """The full history as CSV. Exporting someone else's needs Manage Messages."""
+    member = member or ctx.author
+    if not can_view_history(ctx.author, member.id):
+        raise commands.MissingPermissions(["manage_messages"])
+    data, count, as_of = await asyncio.to_thread(export_history_csv, ctx.guild.id, member.id)
+    if not count:
+        await ctx.reply(f"❓ No points history for **{member.display_name}** yet.{staleness_note(as_of)}")
+        return
+    note = f" (newest {count:,} entries)" if count >= HISTORY_EXPORT_MAX_ROWS else ""
+    await ctx.reply(f"📜 Points history for **{member.display_name}**{note}{staleness_note(as_of)}",
+                    file=discord.File(io.BytesIO(data), filename=f"points_history_{member.id}.csv"))
+
+
+@bot.command(name="housecup")
+async def house_cup(ctx: commands.Context):
+    rows, as_of = await asyncio.to_thread(get_house_cup, ctx.guild.id)
+
+    if not rows:
+        await ctx.reply(f"No house totals yet. People need to `{ctx.clean_prefix}sort` first.")
+        return
+
+    lines = [f"**{i}. {house}** — **{total}**" for i, (house, total) in enumerate(rows, start=1)]
+    await ctx.reply("🏆 **House Cup Standings**\n" + "\n".join(lines) + staleness_note(as_of))
+
+
+LOG_KIND_NAMES = {
+    LOG_MANUAL: "Moderator points",
+    LOG_REACTION_ADDED: "Reaction awards",
+    LOG_REACTION_REMOVED: "Reactions removed",
+    LOG_REACTION_CLEARED: "Reactions cleared",
+}
+
+
+@bot.command(name="audit")
+@commands.has_permissions(manage_guild=True)
+async def audit(ctx: commands.Context):
+    """(Admin) Where this server's points came from, from the analytics snapshot."""
+    audit_data = await asyncio.to_thread(get_audit, ctx.guild.id)
+    if audit_data is None:
+        await ctx.reply("⏳ The analytics snapshot isn't ready yet. Try again in a few minutes.")
+        return
+    kinds, moderators, as_of = audit_data
+    if not kinds:
+        await ctx.reply(f"No points have been logged yet.{staleness_note(as_of)}")
+        return
+    lines = ["🧾 **Points audit**"]
+    lines += [f"{LOG_KIND_NAMES.get(kind, f'Kind {kind}')}: **{entries:,}** entries, net **{net:+,}**"
+              for kind, entries, net in kinds]
+    if moderators:
+        lines.append("Most active moderators: " + ", ".join(
+            f"<@{user_id}> ({entries:,} entries, {net:+,})" for user_id, entries, net in moderators))
+    await ctx.reply("\n".join(lines) + staleness_note(as_of), allowed_mentions=discord.AllowedMentions.none())
+
+
+@bot.group(name="term", invoke_without_command=True)
+@commands.has_permissions(manage_guild=True)
+async def term_group(ctx: commands.Context):
+    """(Admin) House Cup terms: schedule, status, end."""
+    await ctx.reply(
+        f"Use `{ctx.clean_prefix}term schedule <days> #channel [YYYY-MM-DDTHH:MM]`, `{ctx.clean_prefix}term status`, "
+        f"`{ctx.clean_prefix}term end` or `{ctx.clean_prefix}term unschedule`"
+    )
+
+
+@term_group.command(name="schedule")
+@commands.has_permissions(manage_guild=True)
+async def term_schedule(ctx: commands.Context, days: int, channel: discord.TextChannel,
+                        first_run: str | None = None):
+    if days <= 0:
+        await ctx.reply("Term length must be at least 1 day.")
+        return
+    if first_run:
+        try:
+            next_run = as_naive_utc(datetime.fromisoformat(first_run))
+        except ValueError:
+            await ctx.reply("❌ First run must look like `2025-09-01T18:00` (UTC).")
+            return
+    else:
+        next_run = datetime.utcnow() + timedelta(days=days)
+    set_term_schedule(ctx.guild.id, channel.id, days, next_run)
+    await ctx.reply(f"📅 Terms last **{days}** days. Next rollover **{next_run:%Y-%m-%d %H:%M} UTC**, "
+                    f"results go to {channel.mention}.")
+
+
+@term_group.command(name="unschedule")
+@commands.has_permissions(manage_guild=True)
+async def term_unschedule(ctx: commands.Context):
+    if clear_term_schedule(ctx.guild.id):
+        await ctx.reply("🗑️ Term schedule removed.")
+    else:
+        await ctx.reply("No term schedule was set.")
+
+
+@term_group.command(name="status")
+@commands.has_permissions(manage_guild=True)
+async def term_status(ctx: commands.Context):
+    schedule = get_term_schedule(ctx.guild.id)
+    if not schedule:
+        await ctx.reply(f"No term schedule. Use `{ctx.clean_prefix}term schedule`.")
+        return
+    channel_id, interval_days, next_run_at = schedule
+    next_run = datetime.fromisoformat(next_run_at)
+    running = " (rollover in progress)" if ctx.guild.id in ROLLOVERS_RUNNING else ""
+    await ctx.reply(f"📅 Every **{interval_days}** days → <#{channel_id}>. "
+                    f"Next rollover **{next_run:%Y-%m-%d %H:%M} UTC**{running}.")
+
+
+@term_group.command(name="end")
+@commands.has_permissions(manage_guild=True)
+async def term_end(ctx: commands.Context, confirm: str | None = None):
+    """(Admin) Close the current term now: archive standings and reset points. Needs `confirm`."""
+    if confirm is None or confirm.lower() != "confirm":
+        await ctx.reply("⚠️ This archives the standings and resets **every member’s points** to 0, and it "
+                        f"can’t be undone. Run `{ctx.clean_prefix}term end confirm` to go ahead.")
+        return
+    if ctx.guild.id in ROLLOVERS_RUNNING:
+        await ctx.reply("⏳ A rollover is already running.")
+        return
+    await ctx.reply("⏳ Closing the term…")
+    term_id = await run_term_rollover(ctx.guild.id, announce=False)
+    if term_id is None:
+        await ctx.reply("⏳ A rollover is already running.")
+        return
+    await ctx.reply(format_term_results(term_id))
+
+
+@bot.group(name="settings", invoke_without_command=True)
+@commands.has_permissions(manage_guild=True)
+async def settings_group(ctx: commands.Context):
+    """(Admin) Show this server's settings. Subcommands change them."""
+    settings = get_guild_settings(ctx.guild.id)
+    p = ctx.clean_prefix
+    channels = ", ".join(f"<#{c}>" for c in sorted(settings.reaction_channel_ids)) or "all channels"
+    reactions = " ".join(f"{emoji} {points:+d}" for emoji, points in settings.reaction_points.items()) or "none"
+    colours = ", ".join(f"{house} `{value:06x}`" for house, value in settings.house_colors.items())
+    await ctx.reply(
+        f"⚙️ **Settings** ({len(settings.overrides)} overridden)\n"
+        f"Prefix: `{settings.prefix}` | Quiz time per question: **{settings.quiz_timeout}s** | "
+        f"House balancing: **{'on' if settings.house_balancing else 'off'}**\n"
+        f"Reaction points: {reactions}\nReaction channels: {channels}\nRole colours: {colours}\n"
+        f"Change with `{p}settings prefix|timeout|reaction|channels|colour|balancing`, "
+        f"or `{p}settings reset [name]`. Houses come from `{p}quizbank`."
+    )
+
+
+@settings_group.command(name="prefix")
+@commands.has_permissions(manage_guild=True)
+async def settings_prefix(ctx: commands.Context, prefix: str):
+    if len(prefix) > 5 or any(ch.isspace() for ch in prefix):
+        await ctx.reply("❌ Prefix must be 1–5 characters with no spaces.")
+        return
+    update_guild_settings(ctx.guild.id, prefix=prefix)
+    await ctx.reply(f"⚙️ Prefix is now `{prefix}` — e.g. `{prefix}leaderboard`.")
+
+
+@settings_group.command(name="timeout")
+@commands.has_permissions(manage_guild=True)
+async def settings_timeout(ctx: commands.Context, seconds: int):
+    if not 10 <= seconds <= 600:
+        await ctx.reply("❌ Time per question must be between 10 and 600 seconds.")
+        return
+    update_guild_settings(ctx.guild.id, quiz_timeout=seconds)
+    await ctx.reply(f"⚙️ Quiz time is now **{seconds}s** per question.")
+
+
+@settings_group.command(name="reaction")
+@commands.has_permissions(manage_guild=True)
+async def settings_reaction(ctx: commands.Context, emoji: str, points: str):
+    """Set an emoji's points, or `off` to stop it counting."""
+    reaction_points = dict(get_guild_settings(ctx.guild.id).reaction_points)
+    if points.lower() == "off":
+        reaction_points.pop(emoji, None)
+        reply = f"⚙️ {emoji} no longer awards points."
+    else:
+        try:
+            value = int(points)
+        except ValueError:
+            raise commands.BadArgument("points")
+        if value == 0 or abs(value) > 100:
+            await ctx.reply("❌ Points must be between -100 and 100 (use `off` to disable an emoji).")
+            return
+        reaction_points[emoji] = value
+        reply = f"⚙️ {emoji} is now worth **{value:+d}**."
+    update_guild_settings(ctx.guild.id, reaction_points=reaction_points)
+    await ctx.reply(reply)
+
+
+@settings_group.command(name="channels")
+@commands.has_permissions(manage_guild=True)
+async def settings_channels(ctx: commands.Context, channels: commands.Greedy[discord.TextChannel]):
+    """Only count reactions in these channels; no channels means everywhere."""
+    update_guild_settings(ctx.guild.id, reaction_channel_ids=sorted(c.id for c in channels) if channels else None)
+    where = ", ".join(c.mention for c in channels) if channels else "all channels"
+    await ctx.reply(f"⚙️ Reactions now count in {where}.")
+
+
+@settings_group.command(name="colour", aliases=["color"])
+@commands.has_permissions(manage_guild=True)
+async def settings_colour(ctx: commands.Context, house: str, colour: discord.Colour):
+    houses = get_quiz_bank(ctx.guild.id).houses
+    house = next((h for h in houses if h.lower() == house.lower()), None)
+    if house is None:
+        await ctx.reply(f"❌ Pick one of: {', '.join(houses)}")
+        return
+    settings = get_guild_settings(ctx.guild.id)
+    update_guild_settings(ctx.guild.id, house_colors={**settings.overrides.get("house_colors", {}),
+                                                      house: colour.value})
+    role = discord.utils.get(ctx.guild.roles, name=house)
+    if role:
+        try:
+            await role.edit(colour=colour, reason="Sorting Hat: house colour changed")
+        except discord.Forbidden:
+            pass
+    await ctx.reply(f"⚙️ **{house}** is now `{colour.value:06x}`.")
+
+
+@settings_group.command(name="balancing")
+@commands.has_permissions(manage_guild=True)
+async def settings_balancing(ctx: commands.Context, enabled: bool):
+    update_guild_settings(ctx.guild.id, house_balancing=enabled)
+    await ctx.reply(f"⚙️ House balancing is now **{'on' if enabled else 'off'}**.")
+
+
+SETTING_NAMES = {
+    "prefix": "prefix", "timeout": "quiz_timeout", "reaction": "reaction_points",
+    "channels": "reaction_channel_ids", "colour": "house_colors", "color": "house_colors",
+    "balancing": "house_balancing",
+}
+
+
+@settings_group.command(name="reset")
+@commands.has_permissions(manage_guild=True)
+async def settings_reset(ctx: commands.Context, name: str = None):
+    """Back to the defaults: one setting, or all of them."""
+    if name is None:
+        update_guild_settings(ctx.guild.id, **{key: None for key in set(SETTING_NAMES.values())})
+        await ctx.reply("⚙️ All settings are back to the defaults.")
+        return
+    if name.lower() not in SETTING_NAMES:
+        await ctx.reply(f"❌ Unknown setting. Pick one of: {', '.join(sorted(set(SETTING_NAMES) - {'color'}))}")
+        return
+    update_guild_settings(ctx.guild.id, **{SETTING_NAMES[name.lower()]: None})
+    await ctx.reply(f"⚙️ `{name.lower()}` is back to the default.")
+
+
+@bot.command(name="status")
+@commands.has_permissions(manage_guild=True)
+async def bot_status(ctx: commands.Context):
+    """(Admin) Uptime and how long the last restart took."""
+    uptime = time.monotonic() - PROCESS_STARTED
+    ready = f"{LIFECYCLE.ready_seconds:.2f}s" if LIFECYCLE.ready_seconds is not None else "n/a"
+    downtime = f"{LIFECYCLE.downtime_seconds:.1f}s" if LIFECYCLE.downtime_seconds is not None else "n/a"
+    snapshot = (f"{int((datetime.utcnow() - ANALYTICS_SNAPSHOT_AT).total_seconds() // 60)} min old"
+                if ANALYTICS_SNAPSHOT_AT else "not taken yet")
+    await ctx.reply(f"🩺 Up **{timedelta(seconds=int(uptime))}** | restart-to-ready **{ready}** | "
+                    f"downtime before this start **{downtime}** | in-flight **{LIFECYCLE.in_flight}** | "
+                    f"analytics snapshot **{snapshot}**")
+
+
+@bot.command(name="memprofile")
+@commands.has_permissions(manage_guild=True)
+async def memory_profile(ctx: commands.Context):
+    """(Admin) Where the worker's memory goes."""
+    await ctx.reply(f"🧠 **Memory profile**\n```\n{memory_report()}\n```")
+
+
+@bot.command(name="cachestats")
+@commands.has_permissions(manage_guild=True)
+async def cache_stats(ctx: commands.Context):
+    """(Admin) Show cache, operation key and trace buffer usage."""
+    await ctx.reply(
+        f"🗃️ **User cache** — {len(USER_CACHE)}/{USER_CACHE.max_size} records | "
+        f"hits **{USER_CACHE.hits}** / misses **{USER_CACHE.misses}** "
+        f"({USER_CACHE.hit_ratio():.1%} hit ratio)\n"
+        f"🔑 **Op keys** — {OP_KEYS.bloom.count if OP_KEYS.bloom else 0} in filter | "
+        f"DB lookups **{OP_KEYS.lookups}** | duplicates blocked **{OP_KEYS.duplicates}**\n"
+        f"📜 **History pages** — {len(HISTORY_CACHE)}/{HISTORY_CACHE.max_pages} cached\n"
+        f"🧭 **Reaction traces** — sampling {TRACE_SAMPLE_RATE:.1%} | buffered **{TRACE_STATS['buffered']}** | "
+        f"written **{TRACE_STATS['written']}** | dropped (buffer full) **{TRACE_STATS['overflowed']}** | "
+        f"failed writes **{TRACE_STATS['write_errors']}** | {len(TRACE_BUFFER)} pending\n"
+        + "\n".join(
+            f"🌐 **{name} fetches** — {lookups.fetches} sent | {lookups.hits} cached | "
+            f"{lookups.coalesced} coalesced | {len(lookups)} held"
+            for name, lookups in (("Channel", CHANNEL_FETCHES), ("Message", MESSAGE_FETCHES))
+        )
+    )
+
+
+@bot.event
+async def on_command_error(ctx, error):
+    if isinstance(error, ShuttingDown):
+        await ctx.reply("🔁 Restarting — try again in a few seconds.")
+        return
+    if isinstance(error, commands.MissingPermissions):
+        needed = ", ".join(p.replace("_", " ").replace("guild", "server").title() for p in error.missing_permissions)
+        await ctx.reply(f"❌ You don’t have permission for that command (need **{needed}**).")
+        return
+    if isinstance(error, commands.MemberNotFound):
+        await ctx.reply("❌ I can’t find that user. Try mentioning them like `@name`.")
+        return
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.reply(f"❌ Missing info. Example: `{ctx.clean_prefix}points remove @user 5 reason`")
+        return
+    if isinstance(error, commands.BadArgument):
+        await ctx.reply(f"❌ Bad format. Example: `{ctx.clean_prefix}points remove @user 5 reason`")
+        return
+
+    await ctx.reply(f"❌ Error: `{type(error).__name__}`")
+
+
+async def main():
+    discord.utils.setup_logging()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, LIFECYCLE.request_shutdown, sig.name)
+        except NotImplementedError:  # Windows: fall back to KeyboardInterrupt
+            pass
+    # Before connecting: the schema (and any migration) must be in place before the first
+    # gateway event, and a long migration shouldn't stall the event loop once it's live.
+    init_db()
+    async with bot:
+        await bot.start(TOKEN)
+
+
+if __name__ == "__main__":
+    if not TOKEN:
+        raise SystemExit("Missing DISCORD_TOKEN environment variable.")
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Compare plain and balanced sorting over many simulated sorts.
+
+    python tools/bench_balance.py                 # 100k sorts, default bank
+    python tools/bench_balance.py -n 200000 --margin 3 --bank my_bank.json
+
+Every sort answers the bank at random. The plain run uses QuizBank.pick_house; the
+balanced run uses pick_balanced_house with live counts, exactly like HOUSE_BALANCING
+in the bot. At each checkpoint the worst house's distance from its target share is
+printed, so convergence (or drift) is visible.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sorting_hat_bot import (  # noqa: E402
+    BALANCE_MARGIN,
+    QuizBank,
+    default_quiz_bank_data,
+    house_targets,
+    pick_balanced_house,
+)
+
+
+def run(bank: QuizBank, sorts: int, checkpoints: list[int], balanced: bool, margin: int, seed: int):
+    rng = random.Random(seed)
+    targets = house_targets(bank.houses)
+    counts = Counter()
+    report = []
+    started = time.perf_counter()
+    for n in range(1, sorts + 1):
+        order = bank.question_order(rng.getrandbits(31))
+        chosen = [(q, rng.randrange(len(bank.questions[q][1]))) for q in order]
+        scores = bank.score(chosen)
+        if balanced:
+            house = pick_balanced_house(bank, scores, chosen, counts, margin, rng)
+        else:
+            house = bank.pick_house(scores, chosen, rng)
+        counts[house] += 1
+        if n in checkpoints:
+            worst = max(abs(counts[h] / n - targets[h]) for h in bank.houses)
+            report.append((n, worst))
+    return counts, report, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--sorts", type=int, default=100_000)
+    parser.add_argument("--margin", type=int, default=BALANCE_MARGIN)
+    parser.add_argument("--bank", help="quiz bank JSON (default: the bot's default bank)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.bank:
+        with open(args.bank, encoding="utf-8") as f:
+            bank = QuizBank(json.load(f))
+    else:
+        bank = QuizBank(default_quiz_bank_data())
+
+    checkpoints = sorted({c for c in (100, 1_000, 10_000, 50_000, args.sorts) if c <= args.sorts})
+    plain_counts, plain, plain_time = run(bank, args.sorts, checkpoints, False, args.margin, args.seed)
+    balanced_counts, balanced, balanced_time = run(bank, args.sorts, checkpoints, True, args.margin, args.seed)
+
+    print(f"{args.sorts:,} sorts, margin {args.margin}, bank {bank.version}\n")
+    print(f"{'sorts':>10}  {'plain max dev':>14}  {'balanced max dev':>17}")
+    for (n, p), (_, b) in zip(plain, balanced):
+        print(f"{n:>10,}  {p:>14.3%}  {b:>17.3%}")
+
+    print(f"\n{'house':<16} {'target':>8} {'plain':>8} {'balanced':>9}")
+    for house, target in house_targets(bank.houses).items():
+        print(f"{house:<16} {target:>8.2%} {plain_counts[house] / args.sorts:>8.2%} "
+              f"{balanced_counts[house] / args.sorts:>9.2%}")
+    print(f"\nPer sort: plain {plain_time / args.sorts * 1e6:.1f}µs, "
+          f"balanced {balanced_time / args.sorts * 1e6:.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare per-member add_points against add_points_bulk for one moderator command.
+
+    python tools/bench_bulk_points.py              # 1000 targets
+    python tools/bench_bulk_points.py -n 5000 --runs 5
+
+Both paths run against a fresh database built by the bot's own init_db(). Every SQL
+statement the bot sends is counted through a trace callback, so the table shows
+transactions (COMMITs) and statements per command alongside wall time.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import sorting_hat_bot  # noqa: E402
+
+GUILD_ID = 1_100_000_000_000_000_000
+USER_BASE = 1_200_000_000_000_000_000
+MODERATOR_ID = 1_000
+
+
+def counting_db(stats: Counter):
+    def connect():
+        con = sqlite3.connect(sorting_hat_bot.DB_FILE)
+        con.set_trace_callback(lambda sql: stats.update(
+            ["commits" if sql.strip().upper() == "COMMIT" else "statements"]))
+        return con
+    return connect
+
+
+def per_member(targets: list[int], op_key: int):
+    for i, user_id in enumerate(targets):
+        sorting_hat_bot.add_points(GUILD_ID, user_id, MODERATOR_ID, 10, "bench", op_key=op_key + i)
+
+
+def bulk(targets: list[int], op_key: int):
+    sorting_hat_bot.add_points_bulk(GUILD_ID, targets, MODERATOR_ID, 10, "bench", op_key=op_key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--targets", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=3, help="commands per path (best time is reported)")
+    args = parser.parse_args()
+
+    targets = [USER_BASE + i for i in range(args.targets)]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_bulk_") as workdir:
+        for name, fn in (("per-member add_points", per_member), ("add_points_bulk", bulk)):
+            sorting_hat_bot.DB_FILE = os.path.join(workdir, f"{fn.__name__}.sqlite3")
+            sorting_hat_bot.init_db()
+            stats = Counter()
+            sorting_hat_bot.db = counting_db(stats)
+            best = float("inf")
+            for run in range(args.runs):
+                started = time.perf_counter()
+                fn(targets, op_key=(run + 1) << 32)
+                best = min(best, time.perf_counter() - started)
+            with sqlite3.connect(sorting_hat_bot.DB_FILE) as con:
+                (total,) = con.execute("SELECT SUM(points) FROM users WHERE guild_id=?", (GUILD_ID,)).fetchone()
+            assert total == 10 * args.targets * args.runs, total
+            results[name] = (stats["commits"] / args.runs, stats["statements"] / args.runs, best)
+
+    print(f"{args.targets:,} targets, best of {args.runs}\n")
+    print(f"{'path':<24} {'transactions':>13} {'statements':>11} {'time ms':>9}")
+    for name, (commits, statements, best) in results.items():
+        print(f"{name:<24} {commits:>13,.0f} {statements:>11,.0f} {best * 1000:>9.1f}")
+    (c1, _, t1), (c2, _, t2) = results.values()
+    print(f"\n{c1 / c2:,.0f}x fewer transactions, {t1 / t2:,.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
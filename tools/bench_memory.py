@@ -0,0 +1,93 @@
+"""Compare worker RSS under different member cache policies at simulated guild sizes.
+
+    python tools/bench_memory.py                        # 10k and 100k members
+    python tools/bench_memory.py --members 10000 50000 250000
+
+Each case runs in a fresh interpreter: it imports the bot, builds a discord.py
+ConnectionState with the policy's MemberCacheFlags, loads one guild from a
+GUILD_CREATE-shaped payload with N members, and fills the bot's own user record cache
+as if those members had been looked up. RSS is read before and after, so the numbers
+are what that guild costs the process, not estimates.
+"""
+import argparse
+import gc
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+POLICIES = ("full", "voice-only", "none")
+
+
+def run_case(members: int, policy: str):
+    sys.path.insert(0, str(ROOT))
+    import discord
+    from discord.state import ConnectionState
+
+    import sorting_hat_bot
+
+    flags = {
+        "full": discord.MemberCacheFlags.from_intents(sorting_hat_bot.intents),
+        "voice-only": discord.MemberCacheFlags(voice=True, joined=False),
+        "none": discord.MemberCacheFlags.none(),
+    }[policy]
+    state = ConnectionState(dispatch=lambda *a, **k: None, handlers={}, hooks={}, http=None,
+                            intents=sorting_hat_bot.intents, member_cache_flags=flags,
+                            max_messages=sorting_hat_bot.MAX_MESSAGES)
+
+    gc.collect()
+    start = sorting_hat_bot.rss_bytes()
+    # Members are generated while the guild consumes them, so the payload itself never sits in memory.
+    payload = {
+        "id": "1100000000000000000", "name": "bench", "owner_id": "1", "member_count": members,
+        "roles": [{"id": "1100000000000000000", "name": "@everyone", "permissions": "0", "position": 0,
+                   "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+        "emojis": [], "stickers": [], "channels": [], "threads": [], "features": [],
+        "members": ({
+            "user": {"id": str(1_200_000_000_000_000_000 + i), "username": f"member{i}", "discriminator": "0",
+                     "global_name": f"Member {i}", "avatar": None},
+            "roles": [], "joined_at": "2025-01-01T00:00:00+00:00", "deaf": False, "mute": False, "nick": None,
+            "flags": 0,
+        } for i in range(members)),
+    }
+    guild = discord.Guild(data=payload, state=state)
+    gc.collect()
+    after_guild = sorting_hat_bot.rss_bytes()
+
+    for i in range(min(members, sorting_hat_bot.USER_CACHE_SIZE)):
+        sorting_hat_bot.USER_CACHE.put((guild.id, 1_200_000_000_000_000_000 + i), ("Gryffindor", i, None))
+    gc.collect()
+    after_ours = sorting_hat_bot.rss_bytes()
+
+    print(json.dumps({
+        "members": members, "policy": policy, "cached_members": len(guild.members),
+        "rss_start": start, "rss_guild": after_guild, "rss_end": after_ours,
+        "ours": sorting_hat_bot.deep_sizeof(sorting_hat_bot.USER_CACHE._entries),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--case", nargs=2, metavar=("MEMBERS", "POLICY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(int(args.case[0]), args.case[1])
+        return
+
+    print(f"{'members':>9} {'policy':<12} {'cached':>9} {'guild MiB':>10} {'B/member':>9} "
+          f"{'our cache MiB':>14} {'total RSS MiB':>14}")
+    for members in args.members:
+        for policy in POLICIES:
+            out = subprocess.run([sys.executable, __file__, "--case", str(members), policy],
+                                 capture_output=True, text=True, check=True).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            guild = r["rss_guild"] - r["rss_start"]
+            print(f"{members:>9,} {policy:<12} {r['cached_members']:>9,} {guild / 2**20:>10.1f} "
+                  f"{guild / members:>9,.0f} {r['ours'] / 2**20:>14.1f} {r['rss_end'] / 2**20:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Measure the compact storage format against the original one on synthetic data.
+
+    python tools/bench_storage.py                  # 10M points_log rows
+    python tools/bench_storage.py --rows 1000000 --keep /tmp/bench
+
+Builds a database in the original layout (TEXT emoji keys, formatted reaction
+reasons, rowid tables), copies it, migrates the copy with the bot's own init_db(),
+VACUUMs both and reports file/table/index sizes plus timings for the queries the bot
+actually runs.
+"""
+import argparse
+import gc
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import sorting_hat_bot  # noqa: E402
+
+EMOJIS = ["❤️", "❤", "😂", "🤣", "😍", "👍", "💯", "😢", "😭", "👎"]
+GUILD_ID = 1_100_000_000_000_000_000
+USER_BASE = 1_200_000_000_000_000_000
+MESSAGE_BASE = 1_300_000_000_000_000_000
+
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL, house TEXT,
+    points INTEGER NOT NULL DEFAULT 0, sorted_at TEXT,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE TABLE points_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER NOT NULL, target_user_id INTEGER NOT NULL,
+    moderator_user_id INTEGER NOT NULL, delta INTEGER NOT NULL, reason TEXT, created_at TEXT NOT NULL
+);
+CREATE TABLE reaction_awards (
+    guild_id INTEGER NOT NULL, message_id INTEGER NOT NULL, reactor_user_id INTEGER NOT NULL,
+    emoji TEXT NOT NULL, delta INTEGER NOT NULL, created_at TEXT NOT NULL,
+    PRIMARY KEY (guild_id, message_id, reactor_user_id, emoji)
+);
+"""
+
+
+def build_legacy(path: str, rows: int, users: int, seed: int):
+    rng = random.Random(seed)
+    con = sqlite3.connect(path)
+    con.executescript(LEGACY_SCHEMA)
+    con.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?)", (
+        (GUILD_ID, USER_BASE + u, rng.choice(sorting_hat_bot.HOUSES), 0, "2025-01-01T00:00:00")
+        for u in range(users)
+    ))
+
+    awards = {}
+
+    def log_rows():
+        for i in range(rows):
+            created = f"2025-01-01T00:00:{i % 60:02d}.{i % 1_000_000:06d}"
+            target = USER_BASE + rng.randrange(users)
+            actor = USER_BASE + rng.randrange(users)
+            if rng.random() < 0.1:
+                yield GUILD_ID, target, actor, rng.randint(1, 20), "Great answer in class", created
+                continue
+            message = MESSAGE_BASE + rng.randrange(rows // 4 + 1)
+            emoji = rng.choice(EMOJIS)
+            delta = sorting_hat_bot.REACTION_POINTS.get(emoji, 1)
+            if rng.random() < 0.85:
+                awards[(message, actor, emoji)] = (delta, created, target)
+                yield GUILD_ID, target, actor, delta, f"Reaction {emoji} on msg {message}", created
+            else:
+                yield GUILD_ID, target, actor, -delta, f"Removed reaction {emoji} on msg {message}", created
+
+    con.executemany("""
+        INSERT INTO points_log (guild_id, target_user_id, moderator_user_id, delta, reason, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, log_rows())
+    con.executemany("INSERT INTO reaction_awards VALUES (?, ?, ?, ?, ?, ?)", (
+        (GUILD_ID, message, actor, emoji, delta, created)
+        for (message, actor, emoji), (delta, created, _) in awards.items()
+    ))
+    con.commit()
+    con.close()
+    return list(awards)
+
+
+def sizes(path: str) -> dict[str, int]:
+    con = sqlite3.connect(path)
+    try:
+        return dict(con.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        con.close()
+
+
+def vacuum(path: str):
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=DELETE")
+    con.execute("VACUUM")
+    con.close()
+
+
+def timed(con: sqlite3.Connection, sql: str, params_list: list[tuple]) -> float:
+    """Mean milliseconds per execution."""
+    started = time.perf_counter()
+    for params in params_list:
+        con.execute(sql, params).fetchall()
+    return (time.perf_counter() - started) * 1000 / len(params_list)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000, help="points_log rows")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000, help="point queries per timing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", help="directory to keep the generated databases in")
+    args = parser.parse_args()
+
+    workdir = args.keep or tempfile.mkdtemp(prefix="bench_storage_")
+    os.makedirs(workdir, exist_ok=True)
+    legacy_path = os.path.join(workdir, "legacy.sqlite3")
+    compact_path = os.path.join(workdir, "compact.sqlite3")
+    for path in (legacy_path, compact_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    try:
+        started = time.perf_counter()
+        award_keys = build_legacy(legacy_path, args.rows, args.users, args.seed)
+        print(f"Built legacy database ({args.rows:,} log rows, {len(award_keys):,} awards) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        shutil.copyfile(legacy_path, compact_path)
+        sorting_hat_bot.DB_FILE = compact_path
+        started = time.perf_counter()
+        sorting_hat_bot.init_db()
+        gc.collect()  # the bot's db() connections aren't closed explicitly; release the file for VACUUM
+        print(f"Migrated copy with init_db() in {time.perf_counter() - started:.1f}s")
+
+        for path in (legacy_path, compact_path):
+            vacuum(path)
+
+        legacy_sizes, compact_sizes = sizes(legacy_path), sizes(compact_path)
+        print(f"\n{'object':<36} {'legacy MB':>10} {'compact MB':>11} {'change':>8}")
+        for name in sorted(set(legacy_sizes) | set(compact_sizes)):
+            before, after = legacy_sizes.get(name, 0), compact_sizes.get(name, 0)
+            change = f"{after / before - 1:+.0%}" if before else "new"
+            print(f"{name:<36} {before / 1e6:>10.1f} {after / 1e6:>11.1f} {change:>8}")
+        before, after = os.path.getsize(legacy_path), os.path.getsize(compact_path)
+        print(f"{'file total':<36} {before / 1e6:>10.1f} {after / 1e6:>11.1f} {after / before - 1:>+8.0%}")
+
+        rng = random.Random(args.seed + 1)
+        legacy = sqlite3.connect(legacy_path)
+        compact = sqlite3.connect(compact_path)
+        emoji_ids = dict(compact.execute("SELECT emoji, id FROM emojis").fetchall())
+        sample = [rng.choice(award_keys) for _ in range(args.lookups)]
+        users = [(GUILD_ID, USER_BASE + rng.randrange(args.users)) for _ in range(args.lookups)]
+
+        checks = [
+            ("award lookup by PK",
+             timed(legacy, "SELECT delta FROM reaction_awards WHERE guild_id=? AND message_id=? "
+                           "AND reactor_user_id=? AND emoji=?",
+                   [(GUILD_ID, m, a, e) for m, a, e in sample]),
+             timed(compact, "SELECT delta FROM reaction_awards WHERE guild_id=? AND message_id=? "
+                            "AND reactor_user_id=? AND emoji_id=?",
+                   [(GUILD_ID, m, a, emoji_ids[e]) for m, a, e in sample])),
+            ("awards on a message",
+             timed(legacy, "SELECT reactor_user_id, emoji, delta FROM reaction_awards "
+                           "WHERE guild_id=? AND message_id=?", [(GUILD_ID, m) for m, _, _ in sample]),
+             timed(compact, "SELECT reactor_user_id, emoji_id, delta FROM reaction_awards "
+                            "WHERE guild_id=? AND message_id=?", [(GUILD_ID, m) for m, _, _ in sample])),
+            ("user record by PK",
+             timed(legacy, "SELECT house, points, sorted_at FROM users WHERE guild_id=? AND user_id=?", users),
+             timed(compact, "SELECT house, points, sorted_at FROM users WHERE guild_id=? AND user_id=?", users)),
+            ("reaction points total (log scan)",
+             timed(legacy, "SELECT SUM(delta) FROM points_log WHERE reason LIKE 'Reaction %'", [()]),
+             timed(compact, "SELECT SUM(delta) FROM points_log WHERE kind=?", [(sorting_hat_bot.LOG_REACTION_ADDED,)])),
+        ]
+        legacy.close()
+        compact.close()
+
+        print(f"\n{'query':<36} {'legacy ms':>10} {'compact ms':>11} {'speedup':>8}")
+        for name, before, after in checks:
+            print(f"{name:<36} {before:>10.4f} {after:>11.4f} {before / after:>7.2f}x")
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
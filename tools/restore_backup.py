@@ -0,0 +1,85 @@
+"""Restore sorting_hat.sqlite3 from a snapshot written by the bot's backup task.
+
+    python tools/restore_backup.py --list
+    python tools/restore_backup.py --latest
+    python tools/restore_backup.py backups/sorting_hat-20250101T000000Z.sqlite3.gz
+
+Stop the worker first. The snapshot is decompressed and integrity-checked before
+anything is touched, the current database is copied aside as
+<db>.pre-restore-<timestamp>, and the restore itself goes through SQLite's backup
+API so any leftover WAL/SHM files are handled correctly.
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+
+BACKUP_PREFIX = "sorting_hat-"
+BACKUP_SUFFIX = ".sqlite3.gz"
+
+
+def list_backups(backup_dir: str) -> list[str]:
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted(n for n in os.listdir(backup_dir) if n.startswith(BACKUP_PREFIX) and n.endswith(BACKUP_SUFFIX))
+    return [os.path.join(backup_dir, n) for n in names]
+
+
+def copy_db(src_path: str, dst_path: str):
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("snapshot", nargs="?", help="snapshot file to restore")
+    parser.add_argument("--latest", action="store_true", help="restore the newest snapshot")
+    parser.add_argument("--list", action="store_true", help="list snapshots and exit")
+    parser.add_argument("--db", default="sorting_hat.sqlite3", help="database to restore into")
+    parser.add_argument("--backup-dir", default="backups")
+    args = parser.parse_args()
+
+    snapshots = list_backups(args.backup_dir)
+    if args.list:
+        for path in snapshots:
+            print(f"{path}  {os.path.getsize(path):>12,} bytes")
+        return
+
+    snapshot = args.snapshot or (snapshots[-1] if args.latest and snapshots else None)
+    if not snapshot:
+        sys.exit("Nothing to restore: pass a snapshot path or --latest (see --list).")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = os.path.join(tmp, "restore.sqlite3")
+        with gzip.open(snapshot, "rb") as src, open(raw_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+        con = sqlite3.connect(raw_path)
+        try:
+            (result,) = con.execute("PRAGMA integrity_check").fetchone()
+        finally:
+            con.close()
+        if result != "ok":
+            sys.exit(f"Snapshot {snapshot} failed integrity check: {result}")
+
+        if os.path.exists(args.db):
+            aside = f"{args.db}.pre-restore-{datetime.utcnow():%Y%m%dT%H%M%SZ}"
+            copy_db(args.db, aside)
+            print(f"Current database saved to {aside}")
+
+        copy_db(raw_path, args.db)
+
+    print(f"Restored {args.db} from {snapshot}")
+
+
+if __name__ == "__main__":
+    main()
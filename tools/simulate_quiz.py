@@ -0,0 +1,109 @@
+"""Simulate random answer sheets against a quiz bank and report house balance.
+
+    python tools/simulate_quiz.py                      # default bank, 1M sheets
+    python tools/simulate_quiz.py -n 5000000 --bank my_bank.json --seed 7
+
+Uses numpy when it's installed (millions of sheets in seconds); otherwise falls back to
+the bot's own QuizBank.score/pick_house, which is exact but much slower.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sorting_hat_bot import QuizBank, default_quiz_bank_data  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BATCH = 250_000  # sheets per numpy batch, keeps memory flat for large runs
+
+
+def simulate_numpy(bank: QuizBank, sheets: int, seed: int) -> Counter:
+    rng = np.random.default_rng(seed)
+    n_questions, n_houses = len(bank.questions), len(bank.houses)
+    max_options = max(len(options) for _, options in bank.questions)
+
+    # Pad to a dense question × option × house tensor; padded options are never drawn.
+    weights = np.zeros((n_questions, max_options, n_houses), dtype=np.int32)
+    leaders = np.full((n_questions, max_options), -1, dtype=np.int64)
+    option_counts = np.array([len(options) for _, options in bank.questions])
+    for q, rows in enumerate(bank.weights):
+        weights[q, :len(rows)] = rows
+        leaders[q, :len(rows)] = [-1 if lead is None else lead for lead in bank.leaders[q]]
+
+    counts = np.zeros(n_houses, dtype=np.int64)
+    done = 0
+    while done < sheets:
+        size = min(BATCH, sheets - done)
+        if bank.subset_size is None or bank.subset_size == n_questions:
+            asked = np.broadcast_to(np.arange(n_questions), (size, n_questions))
+        else:
+            asked = np.argsort(rng.random((size, n_questions)), axis=1)[:, :bank.subset_size]
+        picks = (rng.random(asked.shape) * option_counts[asked]).astype(np.int64)
+
+        scores = weights[asked, picks].sum(axis=1)  # (size, houses)
+        tied = scores == scores.max(axis=1, keepdims=True)
+
+        # Same weighted tie-break as QuizBank.pick_house: 1 + answers led by each tied house.
+        lead = leaders[asked, picks]
+        lead_counts = np.stack([(lead == h).sum(axis=1) for h in range(n_houses)], axis=1)
+        tie_weights = np.where(tied, lead_counts + 1, 0).cumsum(axis=1)
+        draw = rng.random(size) * tie_weights[:, -1]
+        winners = (tie_weights <= draw[:, None]).sum(axis=1)
+
+        counts += np.bincount(winners, minlength=n_houses)
+        done += size
+
+    return Counter({bank.houses[h]: int(c) for h, c in enumerate(counts)})
+
+
+def simulate_python(bank: QuizBank, sheets: int, seed: int) -> Counter:
+    rng = random.Random(seed)
+    counts = Counter()
+    for _ in range(sheets):
+        order = bank.question_order(rng.getrandbits(31))
+        chosen = [(q, rng.randrange(len(bank.questions[q][1]))) for q in order]
+        counts[bank.pick_house(bank.score(chosen), chosen, rng)] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--sheets", type=int, default=1_000_000, help="answer sheets to simulate")
+    parser.add_argument("--bank", help="quiz bank JSON (default: the bot's default bank)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pure-python", action="store_true", help="skip numpy even if it's installed")
+    args = parser.parse_args()
+
+    if args.bank:
+        with open(args.bank, encoding="utf-8") as f:
+            bank = QuizBank(json.load(f))
+    else:
+        bank = QuizBank(default_quiz_bank_data())
+
+    use_numpy = np is not None and not args.pure_python
+    started = time.perf_counter()
+    counts = (simulate_numpy if use_numpy else simulate_python)(bank, args.sheets, args.seed)
+    elapsed = time.perf_counter() - started
+
+    expected = args.sheets / len(bank.houses)
+    print(f"Bank {bank.version}: {len(bank.questions)} questions, "
+          f"{bank.subset_size or len(bank.questions)} asked, {len(bank.houses)} houses")
+    print(f"{args.sheets:,} sheets in {elapsed:.2f}s ({'numpy' if use_numpy else 'pure python'})\n")
+    for house in bank.houses:
+        share = counts[house] / args.sheets
+        print(f"  {house:<16} {counts[house]:>12,}  {share:7.2%}  ({counts[house] / expected - 1:+.1%} vs even)")
+    spread = (max(counts.values()) - min(counts[h] for h in bank.houses)) / args.sheets
+    print(f"\nMax − min share: {spread:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Summarise reaction traces written by the bot (TRACE_SAMPLE_RATE > 0).
+
+    python tools/trace_report.py
+    python tools/trace_report.py --guild 1234 --event add --since 2025-01-01T00:00
+    python tools/trace_report.py --outcome message_fetch_failed --show 20
+
+Reads traces/reactions.jsonl plus its rotated siblings (.1, .2, ...) and prints
+how many events ended in each outcome and the latency of every pipeline stage.
+"""
+import argparse
+import glob
+import json
+import os
+from collections import Counter, defaultdict
+
+
+def trace_files(path: str) -> list[str]:
+    """Oldest first: reactions.jsonl.N … reactions.jsonl.1, reactions.jsonl."""
+    rotated = [p for p in glob.glob(glob.escape(path) + ".*") if p.rsplit(".", 1)[-1].isdigit()]
+    rotated.sort(key=lambda p: int(p.rsplit(".", 1)[-1]), reverse=True)
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def read_traces(paths: list[str]):
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default="traces/reactions.jsonl")
+    parser.add_argument("--guild", type=int)
+    parser.add_argument("--event", choices=["add", "remove"])
+    parser.add_argument("--outcome", help="only this outcome")
+    parser.add_argument("--since", help="ISO timestamp (UTC)")
+    parser.add_argument("--show", type=int, default=0, help="also print the N most recent matching traces")
+    args = parser.parse_args()
+
+    outcomes = Counter()
+    stage_times = defaultdict(list)
+    totals = defaultdict(list)
+    recent = []
+    for record in read_traces(trace_files(args.file)):
+        if args.guild is not None and record.get("guild_id") != args.guild:
+            continue
+        if args.event and record.get("event") != args.event:
+            continue
+        if args.outcome and record.get("outcome") != args.outcome:
+            continue
+        if args.since and record.get("ts", "") < args.since:
+            continue
+
+        outcomes[record["outcome"]] += 1
+        totals[record["outcome"]].append(record["total_ms"])
+        for stage, ms in record.get("stages", {}).items():
+            stage_times[stage].append(ms)
+        if args.show:
+            recent.append(record)
+            recent = recent[-args.show:]
+
+    count = sum(outcomes.values())
+    if not count:
+        print("No matching traces.")
+        return
+
+    print(f"{count:,} traced events\n")
+    print(f"{'outcome':<24} {'events':>9} {'share':>7} {'p50 ms':>9} {'p95 ms':>9}")
+    for outcome, n in outcomes.most_common():
+        print(f"{outcome:<24} {n:>9,} {n / count:>7.1%} "
+              f"{percentile(totals[outcome], 50):>9.2f} {percentile(totals[outcome], 95):>9.2f}")
+
+    print(f"\n{'stage':<24} {'samples':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, values in sorted(stage_times.items(), key=lambda item: -percentile(item[1], 95)):
+        print(f"{stage:<24} {len(values):>9,} {percentile(values, 50):>9.2f} {percentile(values, 95):>9.2f} "
+              f"{percentile(values, 99):>9.2f} {max(values):>9.2f}")
+
+    for record in recent:
+        print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()